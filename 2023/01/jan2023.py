@@ -1,7 +1,11 @@
 # https://research.ibm.com/haifa/ponderthis/challenges/January2023.html
 
-from random import randrange, random, choice, choices
-from copy import deepcopy
+import argparse
+from random import randrange, random, choice
+from itertools import product
+from array import array
+from multiprocessing import Pool, RawArray
+from time import perf_counter
 
 def set_at_pos(string, position, character):
     return string[:position] + character + string[position + 1:]
@@ -146,6 +150,151 @@ class BFSGeneSolver:
     def solve(self, input):
         return self.bfs(input)
 
+# A faster version of BFSGeneSolver for validating the other solvers on 
+# longer genes. States are packed into integers at 2 bits per letter, with the 
+# leftmost letter in the lowest bits, and visited states are marked in a 
+# bytearray indexed by state. The search runs from both the input gene and 
+# the all-'G' goal, expanding whichever frontier is smaller one full layer at 
+# a time. Since moves aren't reversible, the backward search follows the 
+# rules in reverse. Memory use is 4^n bytes for a gene of n letters (after 
+# trailing 'G's are dropped), so about 16MB at 12 letters and 256MB at 14.
+class BidirectionalBFSGeneSolver:
+    letterCodes = {'G': 0, 'A': 1, 'C': 2, 'T': 3}
+    # letter changes permitted away from the leftmost position for each kind 
+    # of context to the left of the letter, as {from: [to, ...]}
+    forwardMoves = {
+        'allCs': {3: [2]},
+        'anC': {3: [0], 2: [1], 1: [2]},
+        'allTs': {2: [3], 0: [3]},
+    }
+    def __init__(self):
+        # the same changes as {to: [from, ...]} for the backward search
+        self.backwardMoves = {}
+        for context, moves in self.forwardMoves.items():
+            reverse = {}
+            for fromLetter, toLetters in moves.items():
+                for toLetter in toLetters:
+                    reverse.setdefault(toLetter, []).append(fromLetter)
+            self.backwardMoves[context] = reverse
+    def encode(self, gene):
+        state = 0
+        for i in range(len(gene)):
+            state |= self.letterCodes[gene[i]] << (2 * i)
+        return state
+    # For each position, the packed prefixes to the left of it that permit 
+    # moves: all 'C's, all 'T's, or 'A's followed by a 'C'. Also the all-'A' 
+    # prefix, since once the prefix is none of these no position further 
+    # right can have a permitting context either.
+    def buildContexts(self, length):
+        self.masks = []
+        self.allCs = []
+        self.allTs = []
+        self.allAs = []
+        self.anCs = []
+        for i in range(length):
+            self.masks.append((1 << (2 * i)) - 1)
+            self.allCs.append(sum(2 << (2 * j) for j in range(i)))
+            self.allTs.append(sum(3 << (2 * j) for j in range(i)))
+            self.allAs.append(sum(1 << (2 * j) for j in range(i)))
+            self.anCs.append(sum(1 << (2 * j) for j in range(i - 1)) | (2 << (2 * (i - 1))) if i > 0 else 0)
+    # the states reachable from (or leading to) the given state in one step
+    def neighbours(self, state, length, moveTable):
+        result = []
+        letter = state & 3
+        for other in range(4):
+            if other != letter:
+                result.append(state ^ letter ^ other)
+        for i in range(1, length):
+            prefix = state & self.masks[i]
+            shift = 2 * i
+            letter = (state >> shift) & 3
+            matched = False
+            if prefix == self.allCs[i]:
+                matched = True
+                for other in moveTable['allCs'].get(letter, []):
+                    result.append(state ^ ((letter ^ other) << shift))
+            if prefix == self.anCs[i]:
+                matched = True
+                for other in moveTable['anC'].get(letter, []):
+                    result.append(state ^ ((letter ^ other) << shift))
+            if prefix == self.allTs[i]:
+                matched = True
+                for other in moveTable['allTs'].get(letter, []):
+                    result.append(state ^ ((letter ^ other) << shift))
+            if not matched and prefix != self.allAs[i]:
+                break
+        return result
+    def bfs(self, input):
+        gene = input
+        while len(gene) > 0 and gene[len(gene) - 1] == 'G':
+            gene = gene[:-1]
+        length = len(gene)
+        if length == 0:
+            return 0
+        self.buildContexts(length)
+        source = self.encode(gene)
+        goal = 0
+        # 1 for states reached from the source, 2 for states reached from the
+        # goal
+        visited = bytearray(4 ** length)
+        visited[source] = 1
+        visited[goal] = 2
+        frontier = [source]
+        backFrontier = [goal]
+        depth = 0
+        backDepth = 0
+        while len(frontier) > 0 and len(backFrontier) > 0:
+            # Before each layer no state has been reached from both ends, so 
+            # the shortest route is at least depth + backDepth + 1 steps and 
+            # the first state reached from both ends completes a route of 
+            # exactly that length.
+            if len(frontier) <= len(backFrontier):
+                nextFrontier = []
+                for state in frontier:
+                    for nextState in self.neighbours(state, length, self.forwardMoves):
+                        mark = visited[nextState]
+                        if mark == 2:
+                            return depth + backDepth + 1
+                        if mark == 0:
+                            visited[nextState] = 1
+                            nextFrontier.append(nextState)
+                frontier = nextFrontier
+                depth += 1
+            else:
+                nextFrontier = []
+                for state in backFrontier:
+                    for nextState in self.neighbours(state, length, self.backwardMoves):
+                        mark = visited[nextState]
+                        if mark == 1:
+                            return depth + backDepth + 1
+                        if mark == 0:
+                            visited[nextState] = 2
+                            nextFrontier.append(nextState)
+                backFrontier = nextFrontier
+                backDepth += 1
+        return -1
+    # Steps from every packed state of the given length to the all-'G' 
+    # state, by one full backward BFS from the goal. Trailing 'G's never need
+    # to change, so a shorter gene padded with 'G's has the same distance.
+    def distances(self, length):
+        self.buildContexts(length)
+        table = array('i', [-1]) * (4 ** length)
+        table[0] = 0
+        frontier = [0]
+        depth = 0
+        while len(frontier) > 0:
+            depth += 1
+            nextFrontier = []
+            for state in frontier:
+                for nextState in self.neighbours(state, length, self.backwardMoves):
+                    if table[nextState] < 0:
+                        table[nextState] = depth
+                        nextFrontier.append(nextState)
+            frontier = nextFrontier
+        return table
+    def solve(self, input):
+        return self.bfs(input)
+
 class RecursiveGeneSolver:
     def __init__(self):
         self.allAsCache = {"A": 0, "C": 1, "G": 1, "T": 1}
@@ -378,10 +527,304 @@ class RecursiveGeneSolver:
     def solve(self, array):
         return self.toAllGs(array)
 
+# Iterative equivalent of RecursiveGeneSolver for very long genes.
+# Every rule in the recursive solver splits a problem on a prefix into exactly
+# one sub-problem on a shorter prefix of the same gene, plus a handful of 
+# sub-problems on canonical strings of the same shorter length (CC...C, 
+# TT...T, AA...AC and AA...A). The gene-dependent part is therefore a single 
+# chain of (target, prefix length) links running right to left, and the 
+# canonical parts only depend on length, so they can be built up from length 
+# 1 keeping just the last few lengths in memory. Memory is O(n) small integers
+# for the chain plus a constant number of big integers.
+class IterativeGeneSolver:
+    # Targets are 'A', 'C', 'T' and 'G' for all-A/C/T/G strings and 'N' for 
+    # the AA...AC form. Canonical strings use the same letters, with 'N' 
+    # again standing for AA...AC.
+    # For a target and the letter at the rightmost position that doesn't 
+    # match it, the next target for the prefix to the left of that position, 
+    # the number of single steps on the letter itself, and the canonical 
+    # (target, string) sub-problems of the prefix length. These mirror the 
+    # branches of RecursiveGeneSolver.
+    rules = {
+        ('A', 'C'): ('N', 1, (('A', 'N'),)),
+        ('A', 'T'): ('C', 2, (('N', 'C'), ('A', 'N'))),
+        ('A', 'G'): ('T', 3, (('C', 'T'), ('N', 'C'), ('A', 'N'))),
+        ('C', 'A'): ('N', 1, (('C', 'N'),)),
+        ('C', 'T'): ('C', 1, ()),
+        ('C', 'G'): ('T', 2, (('C', 'T'),)),
+        ('T', 'A'): ('N', 2, (('T', 'N'),)),
+        ('T', 'C'): ('T', 1, ()),
+        ('T', 'G'): ('T', 1, ()),
+        ('N', 'A'): ('N', 1, (('A', 'N'),)),
+        ('N', 'C'): ('A', 0, ()),
+        ('N', 'T'): ('C', 1, (('A', 'C'),)),
+        ('N', 'G'): ('T', 2, (('C', 'T'), ('A', 'C'))),
+        ('G', 'A'): ('N', 3, (('T', 'N'), ('N', 'T'), ('G', 'N'))),
+        ('G', 'C'): ('T', 2, (('N', 'T'), ('G', 'N'))),
+        ('G', 'T'): ('N', 1, (('G', 'N'),)),
+    }
+    def __init__(self):
+        # only a handful of the (target, canonical string) combinations are 
+        # reachable from the rules, so only those are tabulated
+        self.entries = set()
+        pending = [term for rule in self.rules.values() for term in rule[2]]
+        while len(pending) > 0:
+            entry = pending.pop()
+            if entry in self.entries:
+                continue
+            self.entries.add(entry)
+            top, letter = self.canonicalTop(entry[0], entry[1], 2)
+            if top < 0:
+                continue
+            nextTarget, ones, terms = self.rules[(entry[0], letter)]
+            pending.extend(terms)
+            pending.append((nextTarget, 'A' if entry[1] == 'N' else entry[1]))
+
+    # the position and letter of the rightmost character at or below top 
+    # that doesn't match the target, or (-1, None) if all of them match.
+    def findTop(self, gene, target, top):
+        if target == 'N':
+            return top, gene[top]
+        while top >= 0 and gene[top] == target:
+            top -= 1
+        if top < 0:
+            return -1, None
+        return top, gene[top]
+
+    # the number of steps contributed by a single link of a chain, given the
+    # table of canonical step counts for strings of length top
+    def linkSteps(self, target, letter, top, row):
+        if top == 0:
+            # the leftmost letter can always be changed in one step
+            return 0 if target == 'N' and letter == 'C' else 1
+        ones, terms = self.rules[(target, letter)][1:]
+        steps = ones
+        for term in terms:
+            steps += row[term]
+        return steps
+
+    # the position and letter of the rightmost mismatching character of a 
+    # canonical string of the given length
+    def canonicalTop(self, target, canonical, length):
+        if target == 'N':
+            return length - 1, 'C' if canonical == 'N' else canonical
+        if canonical == 'N':
+            if target == 'C':
+                return (length - 2, 'A') if length > 1 else (-1, None)
+            return length - 1, 'C'
+        if canonical == target:
+            return -1, None
+        return length - 1, canonical
+
+    # build the table of canonical step counts for strings of the given length
+    # from the tables for the two previous lengths
+    def canonicalRow(self, length, previous, beforePrevious):
+        row = {}
+        for target, canonical in self.entries:
+            top, letter = self.canonicalTop(target, canonical, length)
+            if top < 0:
+                row[(target, canonical)] = 0
+                continue
+            topRow = previous if top == length - 1 else beforePrevious
+            steps = self.linkSteps(target, letter, top, topRow)
+            if top > 0:
+                # the prefix of AA...AC is all-A
+                prefix = 'A' if canonical == 'N' else canonical
+                steps += topRow[(self.rules[(target, letter)][0], prefix)]
+            row[(target, canonical)] = steps
+        return row
+
+    # the links of the right-to-left chain of sub-problems on prefixes of the 
+    # gene, as (prefix length, target, letter) with strictly decreasing 
+    # prefix lengths
+    def chain(self, gene, target):
+        links = []
+        top = len(gene) - 1
+        while top >= 0:
+            top, letter = self.findTop(gene, target, top)
+            if top < 0:
+                break
+            links.append((top, target, letter))
+            if top == 0:
+                break
+            target = self.rules[(target, letter)][0]
+            top -= 1
+        return links
+
+    # the tables of canonical step counts for every length below count, for 
+    # callers that need all of them at once
+    def canonicalRows(self, count):
+        rows = [dict.fromkeys(self.entries, 0)]
+        beforePrevious = rows[0]
+        for length in range(1, count):
+            rows.append(self.canonicalRow(length, rows[-1], beforePrevious))
+            beforePrevious = rows[-2]
+        return rows
+
+    # transitions[k][letter][i] is the (next target index, steps) such that 
+    # the step count of a prefix of length k extended by letter, for the 
+    # target targets[i], is steps plus the step count of the prefix itself 
+    # for the next target. The targets must include every next target 
+    # reachable from them through the given letters.
+    def prefixTransitions(self, geneLength, targets, letters):
+        rows = self.canonicalRows(geneLength)
+        transitions = []
+        for k in range(geneLength):
+            byLetter = {}
+            for letter in letters:
+                byTarget = []
+                for target in targets:
+                    if letter == target:
+                        byTarget.append((targets.index(target), 0))
+                        continue
+                    nextTarget = self.rules[(target, letter)][0]
+                    steps = self.linkSteps(target, letter, k, rows[k])
+                    byTarget.append((targets.index(nextTarget), steps))
+                byLetter[letter] = byTarget
+            transitions.append(byLetter)
+        return transitions
+
+    # the step counts for each target of a single-letter gene
+    def singleLetterSteps(self, letter, targets):
+        counts = []
+        for target in targets:
+            if letter == target or (target == 'N' and letter == 'C'):
+                counts.append(0)
+            else:
+                counts.append(1)
+        return counts
+
+    def steps(self, gene, target):
+        links = self.chain(gene, target)
+        steps = 0
+        zeroRow = dict.fromkeys(self.entries, 0)
+        beforePrevious = zeroRow
+        previous = zeroRow
+        length = 0
+        # walk the chain from the shortest prefix up, extending the canonical
+        # tables to each link's prefix length as we go
+        for top, target, letter in reversed(links):
+            while length < top:
+                length += 1
+                previous, beforePrevious = self.canonicalRow(length, previous, beforePrevious), previous
+            steps += self.linkSteps(target, letter, top, previous)
+        return steps
+
+    def solve(self, array):
+        return self.steps(array, 'G')
+
+# Lazily generates the actual sequence of moves taken by the recursive 
+# solver's decomposition, as (position, new letter) pairs, transforming a copy 
+# of the gene in place. The recursion is run on an explicit stack of at most 
+# one frame per prefix length, so memory use is O(n) in the gene length 
+# however many moves are produced.
+class GeneMoveStream:
+    # For a target and the letter at the rightmost position that doesn't 
+    # match it, the plan followed by the recursive solver: ('sub', target) to 
+    # transform the prefix to the left into the target form, or ('set', 
+    # letter) to change the letter itself.
+    plans = {
+        ('A', 'C'): [('sub', 'N'), ('set', 'A'), ('sub', 'A')],
+        ('A', 'T'): [('sub', 'C'), ('set', 'C'), ('sub', 'N'), ('set', 'A'), ('sub', 'A')],
+        ('A', 'G'): [('sub', 'T'), ('set', 'T'), ('sub', 'C'), ('set', 'C'), ('sub', 'N'), ('set', 'A'), ('sub', 'A')],
+        ('C', 'A'): [('sub', 'N'), ('set', 'C'), ('sub', 'C')],
+        ('C', 'T'): [('sub', 'C'), ('set', 'C')],
+        ('C', 'G'): [('sub', 'T'), ('set', 'T'), ('sub', 'C'), ('set', 'C')],
+        ('T', 'A'): [('sub', 'N'), ('set', 'C'), ('sub', 'T'), ('set', 'T')],
+        ('T', 'C'): [('sub', 'T'), ('set', 'T')],
+        ('T', 'G'): [('sub', 'T'), ('set', 'T')],
+        ('N', 'A'): [('sub', 'N'), ('set', 'C'), ('sub', 'A')],
+        ('N', 'C'): [('sub', 'A')],
+        ('N', 'T'): [('sub', 'C'), ('set', 'C'), ('sub', 'A')],
+        ('N', 'G'): [('sub', 'T'), ('set', 'T'), ('sub', 'C'), ('set', 'C'), ('sub', 'A')],
+        ('G', 'A'): [('sub', 'N'), ('set', 'C'), ('sub', 'T'), ('set', 'T'), ('sub', 'N'), ('set', 'G'), ('sub', 'G')],
+        ('G', 'C'): [('sub', 'T'), ('set', 'T'), ('sub', 'N'), ('set', 'G'), ('sub', 'G')],
+        ('G', 'T'): [('sub', 'N'), ('set', 'G'), ('sub', 'G')],
+    }
+    def moves(self, array, target = 'G'):
+        gene = list(array)
+        # frames of [prefix length, target, plan, next plan step, top]
+        stack = [[len(gene), target, None, 0, 0]]
+        while len(stack) > 0:
+            frame = stack[-1]
+            if frame[2] is None:
+                length, target = frame[0], frame[1]
+                if length == 0:
+                    stack.pop()
+                    continue
+                top = length - 1
+                if target != 'N':
+                    while top >= 0 and gene[top] == target:
+                        top -= 1
+                if top < 0:
+                    stack.pop()
+                    continue
+                if top == 0:
+                    # the leftmost letter can always be changed in one step
+                    letter = 'C' if target == 'N' else target
+                    if gene[0] != letter:
+                        gene[0] = letter
+                        yield (0, letter)
+                    stack.pop()
+                    continue
+                frame[2] = self.plans[(target, gene[top])]
+                frame[4] = top
+            plan, step, top = frame[2], frame[3], frame[4]
+            if step == len(plan):
+                stack.pop()
+                continue
+            frame[3] += 1
+            kind, value = plan[step]
+            if kind == 'sub':
+                stack.append([top, value, None, 0, 0])
+            else:
+                gene[top] = value
+                yield (top, value)
+
+    # write the moves for a gene to a file, one "position letter" pair per 
+    # line, in buffered chunks. Returns the number of moves written.
+    def writeMoves(self, array, filename, chunkSize = 65536):
+        count = 0
+        chunk = []
+        with open(filename, "w") as f:
+            for position, letter in self.moves(array):
+                chunk.append("{0} {1}\n".format(position, letter))
+                if len(chunk) >= chunkSize:
+                    f.write(''.join(chunk))
+                    chunk.clear()
+                count += 1
+            f.write(''.join(chunk))
+        return count
+
+    # lazily read back moves written by writeMoves
+    def readMoves(self, filename):
+        with open(filename, "r") as f:
+            for line in f:
+                position, letter = line.split()
+                yield (int(position), letter)
+
+    # Replay a stream of moves from the given gene, checking that each move is
+    # permitted by the rules and that the result is all 'G's. Returns the 
+    # number of moves, or -1 if the moves are invalid.
+    def verifyMoves(self, array, moves):
+        checker = BFSGeneSolver()
+        checks = {'A': checker.canSetToA, 'C': checker.canSetToC, 'T': checker.canSetToT, 'G': checker.canSetToG}
+        gene = list(array)
+        count = 0
+        for position, letter in moves:
+            if position < 0 or position >= len(gene) or letter not in checks or not checks[letter](gene, position):
+                return -1
+            gene[position] = letter
+            count += 1
+        for letter in gene:
+            if letter != 'G':
+                return -1
+        return count
+
 # A genetic algorithm for finding a gene that can reach an all-G state
 # within the specified range of steps.
 class GeneticAlgorithmGeneSearch:
-    def __init__(self, recursiveSolver, minSteps, maxSteps):
+    def __init__(self, recursiveSolver, minSteps, maxSteps, workers = 1):
         self.recursiveSolver = recursiveSolver
         self.minSteps = minSteps
         self.maxSteps = maxSteps
@@ -390,6 +833,15 @@ class GeneticAlgorithmGeneSearch:
         self.maxGenerations = 20
         self.mutationChance = 0.1
         self.crossoverChance = 0.7
+        # step counts of previously evaluated genes, keyed by the gene as a 
+        # string
+        self.stepsCache = {}
+        self.cacheHits = 0
+        self.cacheMisses = 0
+        # new genes in each generation are evaluated in batches across a pool 
+        # of worker processes if more than one worker is requested
+        self.workers = workers
+        self.pool = None
     # randomized instance of a gene of 'A's and 'C's 
     def randomGene(self):
         gene = []
@@ -403,13 +855,36 @@ class GeneticAlgorithmGeneSearch:
     # trying to minimize deviation from a target value rather than maximize
     # a metric.
     def fitness(self, gene):
-        steps = self.recursiveSolver.solve(gene)
+        key = ''.join(gene)
+        if key in self.stepsCache:
+            self.cacheHits += 1
+            steps = self.stepsCache[key]
+        else:
+            self.cacheMisses += 1
+            steps = self.recursiveSolver.solve(gene)
+            self.stepsCache[key] = steps
         if steps < self.minSteps:
             return float(self.minSteps - steps)
         elif steps > self.maxSteps:
             return float(steps - self.maxSteps)
         else:
             return 0.0
+    # find the step counts for all genes in the population that haven't been 
+    # seen before in one batch, so fitness lookups afterwards are all cache 
+    # hits
+    def evaluatePopulation(self, population):
+        keys = list(dict.fromkeys(key for key in map(''.join, population)
+                                  if key not in self.stepsCache))
+        if len(keys) == 0:
+            return
+        self.cacheMisses += len(keys)
+        if self.pool is not None:
+            chunkSize = max(1, len(keys) // (self.workers * 4))
+            stepsList = self.pool.map(workerSolve, keys, chunkSize)
+        else:
+            stepsList = [self.recursiveSolver.solve(list(key)) for key in keys]
+        for key, steps in zip(keys, stepsList):
+            self.stepsCache[key] = steps
     # GA crossover: swap characters between two randomly selected indexes in
     # each parent chromosome and return the updated versions
     def crossover(self, gene1, gene2):
@@ -417,8 +892,8 @@ class GeneticAlgorithmGeneSearch:
         index2 = randrange(self.geneLength)
         char1 = gene1[index1]
         char2 = gene2[index2]
-        childGene1 = deepcopy(gene1)
-        childGene2 = deepcopy(gene2)
+        childGene1 = list(gene1)
+        childGene2 = list(gene2)
         childGene2[index2] = char1
         childGene1[index1] = char2
         return childGene1, childGene2
@@ -433,19 +908,31 @@ class GeneticAlgorithmGeneSearch:
         return gene
     # pick 2 chromosomes via tournament selection.
     # select n chromosomes from the total population and return the fittest two
-    def tournamentSelection(self, population, n):
-        if len(population) < n:
-            raise Exception("Population of size {0} too small to select {1} elements".format(len(population), n))
+    # The population must already be sorted by fitness. Rather than drawing n 
+    # chromosomes and sorting them, which makes each generation quadratic in 
+    # the population size, the ranks of the fittest two of n uniformly drawn 
+    # chromosomes are sampled directly. Treating each draw as a real number in
+    # [0, size) rounded down to a rank, the smallest of n draws is at least x 
+    # with probability ((size - x) / size)^n, so it can be sampled by 
+    # inverting that, and the second smallest is then the smallest of the 
+    # other n - 1 draws from [first, size).
+    def tournamentSelection(self, rankedPopulation, n):
+        size = len(rankedPopulation)
+        if size < n:
+            raise Exception("Population of size {0} too small to select {1} elements".format(size, n))
         if n < 2:
             raise Exception("Selection of size {0} too small to produce two parents".format(n))
-        selection = choices(population, k = n)
-        sortedSelection = sorted(selection, key=lambda c: self.fitness(c))
-        return deepcopy(sortedSelection[0]), deepcopy(sortedSelection[1])
+        first = size * (1.0 - random() ** (1.0 / n))
+        second = first + (size - first) * (1.0 - random() ** (1.0 / (n - 1)))
+        firstRank = min(size - 1, int(first))
+        secondRank = min(size - 1, int(second))
+        return list(rankedPopulation[firstRank]), list(rankedPopulation[secondRank])
     def reproduceAndReplacePopulation(self, population):
         nextPopulation = []
         selectionSize = len(population) // 2
+        rankedPopulation = sorted(population, key=lambda c: self.fitness(c))
         while(len(nextPopulation) < len(population)):
-            parentGene1, parentGene2 = self.tournamentSelection(population, selectionSize)
+            parentGene1, parentGene2 = self.tournamentSelection(rankedPopulation, selectionSize)
             if(random() < self.crossoverChance):
                 childGene1, childGene2 = self.crossover(parentGene1, parentGene2)
                 nextPopulation.append(childGene1)
@@ -461,7 +948,7 @@ class GeneticAlgorithmGeneSearch:
     def mutatePopulation(self, population):
         nextPopulation = []
         for i in range(len(population)):
-            nextGene = deepcopy(population[i])
+            nextGene = list(population[i])
             if(random() < self.mutationChance):
                 nextPopulation.append(self.mutation(nextGene))
             else:
@@ -469,9 +956,20 @@ class GeneticAlgorithmGeneSearch:
         return nextPopulation
     
     def run(self):
+        if self.workers > 1:
+            self.pool = Pool(self.workers)
+        try:
+            return self.evolve()
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool = None
+    def evolve(self):
         population = []
         for i in range(self.populationSize):
             population.append(self.randomGene())
+        start = perf_counter()
+        self.evaluatePopulation(population)
         # attempting to find fitness no larger than 0
         best = min(population, key = lambda c: self.fitness(c))
         for g in range(self.maxGenerations):
@@ -480,9 +978,11 @@ class GeneticAlgorithmGeneSearch:
                 print("Satisfactory gene found at start of generation {0}".format(g))
                 return best
             avg = sum(map(self.fitness, population))/len(population)
-            print("Generation {0} population {1} minimum deviation {2} average {3}".format(g, len(population), self.fitness(best), avg))
+            print("Generation {0} population {1} minimum deviation {2} average {3} time {4:.3f}s cache hits {5} misses {6}".format(g, len(population), self.fitness(best), avg, perf_counter() - start, self.cacheHits, self.cacheMisses))
+            start = perf_counter()
             population = self.reproduceAndReplacePopulation(population)
             population = self.mutatePopulation(population)
+            self.evaluatePopulation(population)
             highest = min(population, key = lambda c: self.fitness(c))
             if(self.fitness(highest) < self.fitness(best)):
                 best = highest
@@ -492,11 +992,201 @@ class GeneticAlgorithmGeneSearch:
             print("No satisfactory gene found after {0} generations. Best fitness found: {1}".format(self.maxGenerations, self.fitness(best)))
         return best
 
+# Solver used by each worker process in a GeneticAlgorithmGeneSearch pool, 
+# created on first use so its caches persist across batches.
+workerSolver = None
+
+# Find the step count for a gene given as a string in a worker process.
+def workerSolve(key):
+    global workerSolver
+    if workerSolver is None:
+        workerSolver = RecursiveGeneSolver()
+    return workerSolver.solve(list(key))
+
+# Exhaustive search over all genes of 'A's and 'C's of a given length for 
+# every gene that reaches an all-G state within the specified range of steps.
+# Genes are enumerated depth first, left to right, so that all genes sharing 
+# a prefix share the step counts for that prefix. By IterativeGeneSolver's 
+# rules, the step count of a prefix extended by one letter for each target is 
+# a constant plus the step count of the prefix for one other target, so 
+# extending a prefix is O(1). Working backwards from the full gene length also
+# gives, for each prefix length, the range of steps the remaining letters can 
+# add to each target's count, so prefixes that can't land in the range are 
+# pruned.
+class ExhaustiveGeneSearch:
+    # the targets reachable from all-G through 'A' and 'C' letters
+    targets = ['G', 'N', 'T', 'A']
+    def __init__(self, iterativeSolver, minSteps, maxSteps, geneLength):
+        self.minSteps = minSteps
+        self.maxSteps = maxSteps
+        self.geneLength = geneLength
+        self.iterativeSolver = iterativeSolver
+        self.transitions = iterativeSolver.prefixTransitions(geneLength, self.targets, ['A', 'C'])
+        # bounds[k] maps a target index to the minimum and maximum number of 
+        # steps that letters k onwards can add to the prefix's step count for 
+        # that target
+        self.bounds = [None] * (geneLength + 1)
+        self.bounds[geneLength] = {0: (0, 0)}
+        for k in range(geneLength - 1, 0, -1):
+            bound = {}
+            for target, (low, high) in self.bounds[k + 1].items():
+                for letter in ['A', 'C']:
+                    nextTarget, steps = self.transitions[k][letter][target]
+                    if nextTarget in bound:
+                        bound[nextTarget] = (min(bound[nextTarget][0], low + steps), max(bound[nextTarget][1], high + steps))
+                    else:
+                        bound[nextTarget] = (low + steps, high + steps)
+            self.bounds[k] = bound
+        self.visited = 0
+        self.pruned = 0
+    def firstCounts(self, letter):
+        return self.iterativeSolver.singleLetterSteps(letter, self.targets)
+    def inRange(self, depth, counts):
+        for target, (low, high) in self.bounds[depth].items():
+            if counts[target] + low <= self.maxSteps and counts[target] + high >= self.minSteps:
+                return True
+        return False
+    def search(self, gene, counts, results):
+        self.visited += 1
+        depth = len(gene)
+        if depth == self.geneLength:
+            if counts[0] >= self.minSteps and counts[0] <= self.maxSteps:
+                results.append((''.join(gene), counts[0]))
+            return
+        if not self.inRange(depth, counts):
+            self.pruned += 1
+            return
+        transitions = self.transitions[depth]
+        for letter in ['A', 'C']:
+            nextCounts = [counts[t] + s for t, s in transitions[letter]]
+            gene.append(letter)
+            self.search(gene, nextCounts, results)
+            gene.pop()
+    # all satisfying genes starting with the given prefix, as (gene, steps)
+    def run(self, prefix = ''):
+        results = []
+        if len(prefix) == 0:
+            for letter in ['A', 'C']:
+                self.search([letter], self.firstCounts(letter), results)
+            return results
+        counts = self.firstCounts(prefix[0])
+        for k in range(1, len(prefix)):
+            counts = [counts[t] + s for t, s in self.transitions[k][prefix[k]]]
+        self.search(list(prefix), counts, results)
+        return results
+
+# Direct construction of a gene of 'A's and 'C's that reaches an all-G state 
+# within the specified range of steps. The letters are chosen from right to 
+# left, since the rightmost letters contribute the most steps. Following 
+# IterativeGeneSolver's chain of prefixes, choosing a letter adds a known 
+# number of steps and fixes the target for the prefix to its left, and the 
+# range of step counts any prefix of each length can have for each target is 
+# known in advance, so a letter is only chosen if the range can still be met.
+# The ranges aren't always fully attainable, so choices are backtracked when
+# they lead to a dead end, but in practice this is rare and the construction 
+# takes close to linear time in the gene length.
+class DirectGeneSearch:
+    # the targets reachable from all-G through 'A' and 'C' letters
+    targets = ['G', 'N', 'T', 'A']
+    def __init__(self, iterativeSolver, minSteps, maxSteps, geneLength):
+        self.minSteps = minSteps
+        self.maxSteps = maxSteps
+        self.geneLength = geneLength
+        self.transitions = iterativeSolver.prefixTransitions(geneLength, self.targets, ['A', 'C'])
+        self.firstCounts = {}
+        for letter in ['A', 'C']:
+            self.firstCounts[letter] = iterativeSolver.singleLetterSteps(letter, self.targets)
+        # ranges[k][i] is the minimum and maximum step count of any prefix of 
+        # length k for the target targets[i]
+        self.ranges = [None] * (geneLength + 1)
+        self.ranges[1] = []
+        for i in range(len(self.targets)):
+            counts = [self.firstCounts[letter][i] for letter in ['A', 'C']]
+            self.ranges[1].append((min(counts), max(counts)))
+        for k in range(1, geneLength):
+            extended = []
+            for i in range(len(self.targets)):
+                lows = []
+                highs = []
+                for letter in ['A', 'C']:
+                    nextTarget, steps = self.transitions[k][letter][i]
+                    lows.append(steps + self.ranges[k][nextTarget][0])
+                    highs.append(steps + self.ranges[k][nextTarget][1])
+                extended.append((min(lows), max(highs)))
+            self.ranges[k + 1] = extended
+        self.backtracks = 0
+    # the letters that can still meet the step range at position k given the 
+    # steps added so far and the target for the prefix ending at k, as 
+    # (letter, next target, steps so far), most promising first
+    def options(self, k, target, steps):
+        centre = (self.minSteps + self.maxSteps) // 2
+        options = []
+        for letter in ['A', 'C']:
+            if k == 0:
+                total = steps + self.firstCounts[letter][target]
+                if total >= self.minSteps and total <= self.maxSteps:
+                    options.append((0, letter, target, total))
+                continue
+            nextTarget, added = self.transitions[k][letter][target]
+            low, high = self.ranges[k][nextTarget]
+            if steps + added + low <= self.maxSteps and steps + added + high >= self.minSteps:
+                distance = abs(steps + added + (low + high) // 2 - centre)
+                options.append((distance, letter, nextTarget, steps + added))
+        options.sort(reverse = True)
+        return [option[1:] for option in options]
+    # a satisfying gene as a string, or None if there isn't one
+    def run(self):
+        low, high = self.ranges[self.geneLength][0]
+        if low > self.maxSteps or high < self.minSteps:
+            return None
+        gene = [None] * self.geneLength
+        # stack of remaining options at each position, from the right, with 
+        # the most promising option last
+        stack = [self.options(self.geneLength - 1, 0, 0)]
+        while len(stack) > 0:
+            k = self.geneLength - len(stack)
+            if len(stack[-1]) == 0:
+                stack.pop()
+                self.backtracks += 1
+                continue
+            letter, target, steps = stack[-1].pop()
+            gene[k] = letter
+            if k == 0:
+                return ''.join(gene)
+            stack.append(self.options(k - 1, target, steps))
+        return None
+
+# Run an exhaustive search over one shard of the gene space, identified by a 
+# fixed prefix. Defined at the top level so it can be sent to a worker 
+# process.
+def exhaustiveSearchShard(args):
+    minSteps, maxSteps, geneLength, prefix = args
+    geneSearch = ExhaustiveGeneSearch(IterativeGeneSolver(), minSteps, maxSteps, geneLength)
+    return geneSearch.run(prefix), geneSearch.visited, geneSearch.pruned
+
+# Split the exhaustive search into 2^shardLength shards by prefix and run them
+# across a pool of worker processes
+def exhaustiveSearch(minSteps, maxSteps, geneLength, workers):
+    shardLength = min(geneLength, max(0, (workers * 8 - 1).bit_length()))
+    shards = []
+    for prefix in product(['A', 'C'], repeat = shardLength):
+        shards.append((minSteps, maxSteps, geneLength, ''.join(prefix)))
+    results = []
+    visited = 0
+    pruned = 0
+    with Pool(workers) as pool:
+        for shardResults, shardVisited, shardPruned in pool.imap_unordered(exhaustiveSearchShard, shards):
+            results.extend(shardResults)
+            visited += shardVisited
+            pruned += shardPruned
+    results.sort()
+    return results, visited, pruned
+
 # Use the trustworthy-but-slow BFS solver to validate the trickier-but-fast 
 # recursive solver
 def validation():
     print("Starting validation")
-    bfsSolver = BFSGeneSolver()
+    bfsSolver = BidirectionalBFSGeneSolver()
     recursiveSolver = RecursiveGeneSolver()
     # test the provided sample
     sample = "CTTGG"
@@ -523,7 +1213,7 @@ def validation():
         return False
     # test random sequences of varying lengths
     letters = ['T', 'G', 'A', 'C']
-    randomSequenceMax = 5
+    randomSequenceMax = 8
     errorFound = False
     print("Testing random sequences up to {0} characters...".format(randomSequenceMax))
     for i in range(100):
@@ -540,26 +1230,213 @@ def validation():
     else:
         print("Errors found in validation")
     return not errorFound
+
+# Compare the BFS and recursive solvers on every gene with the given prefix 
+# and length. Defined at the top level so it can be sent to a worker process.
+# The BFS distance table for the length is built once by the parent process 
+# and shared with every worker through validationInit.
+validationTable = None
+validationSolvers = None
+
+def validationInit(table):
+    global validationTable, validationSolvers
+    validationTable = table
+    validationSolvers = (BidirectionalBFSGeneSolver(), RecursiveGeneSolver())
+
+def validationShard(args):
+    length, prefix = args
+    bfsSolver, recursiveSolver = validationSolvers
+    table = validationTable
+    mismatches = []
+    count = 0
+    for suffix in product(['G', 'A', 'C', 'T'], repeat = length - len(prefix)):
+        gene = prefix + ''.join(suffix)
+        bfsSteps = table[bfsSolver.encode(gene)]
+        recursiveSteps = recursiveSolver.solve(list(gene))
+        if bfsSteps != recursiveSteps:
+            mismatches.append((gene, bfsSteps, recursiveSteps))
+        count += 1
+    return count, mismatches
+
+# Exhaustively validate the recursive solver against the BFS solver on every 
+# gene of up to maxLength letters, sharding each length by prefix across a 
+# pool of worker processes and reporting throughput per length. The BFS 
+# distance table for each length is built once here and copied into shared 
+# memory for the workers of that length's pool.
+def parallelValidation(maxLength, workers):
+    print("Starting parallel validation of all genes up to {0} characters with {1} worker(s)".format(maxLength, workers))
+    # enough shards per length to keep all workers busy
+    shardLength = max(1, (workers * 8 - 1).bit_length() // 2)
+    errorFound = False
+    bfsSolver = BidirectionalBFSGeneSolver()
+    for length in range(1, maxLength + 1):
+        prefixLength = min(length, shardLength)
+        shards = [(length, ''.join(prefix)) for prefix in product(['G', 'A', 'C', 'T'], repeat = prefixLength)]
+        start = perf_counter()
+        table = bfsSolver.distances(length)
+        sharedTable = RawArray('i', len(table))
+        memoryview(sharedTable).cast('B')[:] = memoryview(table).cast('B')
+        del table
+        tableTime = perf_counter() - start
+        count = 0
+        mismatches = []
+        with Pool(workers, validationInit, (sharedTable,)) as pool:
+            for shardCount, shardMismatches in pool.imap_unordered(validationShard, shards):
+                count += shardCount
+                mismatches.extend(shardMismatches)
+        elapsed = perf_counter() - start
+        print("Length {0}:\t{1} genes in {2:.2f}s ({3:.2f}s BFS table, {4:.0f} genes/sec)\t{5} mismatch(es)".format(length, count, elapsed, tableTime, count / elapsed, len(mismatches)))
+        for gene, bfsSteps, recursiveSteps in sorted(mismatches):
+            print("Sample {0}\tBFS {1} Recursive {2}".format(gene, bfsSteps, recursiveSteps))
+            errorFound = True
+    if not errorFound:
+        print("Validation completed with no errors")
+    else:
+        print("Errors found in validation")
+    return not errorFound
+
+# Compare the recursive and iterative solvers on random genes of lengths the 
+# recursive solver can handle, then time the iterative solver alone on 
+# all-'T' genes far beyond the recursive solver's recursion depth.
+def benchmark():
+    print("Starting benchmark")
+    letters = ['T', 'G', 'A', 'C']
+    samples = 20
+    for length in [20, 100, 200]:
+        genes = []
+        for i in range(samples):
+            genes.append([choice(letters) for j in range(length)])
+        # a fresh recursive solver for each gene, so that its caches don't 
+        # carry over between samples
+        start = perf_counter()
+        recursiveResults = [RecursiveGeneSolver().solve(gene) for gene in genes]
+        recursiveTime = perf_counter() - start
+        iterativeSolver = IterativeGeneSolver()
+        start = perf_counter()
+        iterativeResults = [iterativeSolver.solve(gene) for gene in genes]
+        iterativeTime = perf_counter() - start
+        if recursiveResults != iterativeResults:
+            print("Mismatch between recursive and iterative solvers at length {0}".format(length))
+            return False
+        print("Length {0}:\trecursive {1:.4f}s\titerative {2:.4f}s ({3} genes)".format(length, recursiveTime, iterativeTime, samples))
+    iterativeSolver = IterativeGeneSolver()
+    for length in [1000, 10000, 100000]:
+        start = perf_counter()
+        steps = iterativeSolver.solve(['T'] * length)
+        print("All-'T' length {0}:\titerative {1:.4f}s ({2} bit result)".format(length, perf_counter() - start, steps.bit_length()))
+    return True
     
+# Write the full sequence of moves for a gene to a file, then check the file 
+# by replaying it
+def saveMoves(gene, filename):
+    moveStream = GeneMoveStream()
+    start = perf_counter()
+    count = moveStream.writeMoves(gene, filename)
+    print("Wrote {0} moves to {1} in {2:.2f}s".format(count, filename, perf_counter() - start))
+    start = perf_counter()
+    replayed = moveStream.verifyMoves(gene, moveStream.readMoves(filename))
+    if replayed != count:
+        print("Replaying the moves in {0} failed".format(filename))
+        return False
+    print("Replayed and verified {0} moves in {1:.2f}s".format(replayed, perf_counter() - start))
+    return True
+
 def main():
-    
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--benchmark", action="store_true", help="Benchmark the iterative solver against the recursive solver and exit")
+    parser.add_argument("-v", "--validate", default=0, type=int, help="Validate the recursive solver against the BFS solver on every gene up to this length and exit")
+    parser.add_argument("-e", "--exhaustive", action="store_true", help="Find every satisfying gene by exhaustive search instead of the genetic algorithm")
+    parser.add_argument("-d", "--direct", action="store_true", help="Construct a satisfying gene directly instead of running the genetic algorithm")
+    parser.add_argument("-o", "--moves", help="File to write the full move sequence for the result to (not with --exhaustive)")
+    parser.add_argument("-l", "--length", default=20, type=int, help="Gene length to search")
+    parser.add_argument("--minsteps", default=880000, type=int, help="Minimum steps to reach the all-'G' state")
+    parser.add_argument("--maxsteps", default=890000, type=int, help="Maximum steps to reach the all-'G' state")
+    parser.add_argument("-w", "--workers", default=1, type=int, help="Number of worker processes for the search")
+    parser.add_argument("-p", "--population", default=30, type=int, help="Population size for the genetic algorithm")
+    parser.add_argument("-g", "--generations", default=20, type=int, help="Maximum generations for the genetic algorithm")
+    args = parser.parse_args()
+    if args.length < 1:
+        print("Specified gene length too small: {}".format(args.length))
+        parser.print_usage()
+        exit()
+    if args.minsteps < 0 or args.maxsteps < args.minsteps:
+        print("Specified step range invalid: {0} to {1}".format(args.minsteps, args.maxsteps))
+        parser.print_usage()
+        exit()
+    if args.workers < 1:
+        print("Specified workers too small: {}".format(args.workers))
+        parser.print_usage()
+        exit()
+    if args.population < 4:
+        print("Specified population too small: {}".format(args.population))
+        parser.print_usage()
+        exit()
+    if args.generations < 1:
+        print("Specified generations too small: {}".format(args.generations))
+        parser.print_usage()
+        exit()
+    if args.exhaustive and args.moves is not None:
+        print("Move output is not supported with the exhaustive search, which may report many genes")
+        parser.print_usage()
+        exit()
     print("\n######## Ponder This Challenge - January 2023 ########\n")
+    if args.benchmark:
+        benchmark()
+        return
+    if args.validate > 0:
+        parallelValidation(args.validate, args.workers)
+        return
     # Validation disabled.
     #if not validation():
     #    exit(0)
-    print("Searching for satisfactory gene...")
     recursiveSolver = RecursiveGeneSolver()
-    geneSearch = GeneticAlgorithmGeneSearch(recursiveSolver, 880000,  890000)
-    result = geneSearch.run()
-    if(geneSearch.fitness(result) != 0.0):
-        print("Could not find a satisfying gene in {0} generations. Best match can be completed in {1} steps".format(geneSearch.maxGenerations, recursiveSolver.solve(result)))
-        return
-    print("Result:")
-    print(result)
-    print(recursiveSolver.solve(result))
+    if args.direct:
+        print("Constructing a {0}-letter gene of 'A's and 'C's...".format(args.length))
+        iterativeSolver = IterativeGeneSolver()
+        start = perf_counter()
+        geneSearch = DirectGeneSearch(iterativeSolver, args.minsteps, args.maxsteps, args.length)
+        result = geneSearch.run()
+        print("Finished in {0:.4f}s with {1} backtrack(s)".format(perf_counter() - start, geneSearch.backtracks))
+        if result is None:
+            print("No {0}-letter gene can be completed in the required number of steps".format(args.length))
+            return
+        # cross-check the construction against the solver
+        steps = iterativeSolver.solve(list(result))
+        if steps < args.minsteps or steps > args.maxsteps:
+            print("Constructed gene {0} can be completed in {1} steps, outside the required range".format(result, steps))
+            return
+        print("Result:")
+        print(list(result))
+        print(steps)
+        if args.moves is not None:
+            saveMoves(result, args.moves)
+    elif args.exhaustive:
+        print("Searching all {0}-letter genes of 'A's and 'C's with {1} worker(s)...".format(args.length, args.workers))
+        start = perf_counter()
+        results, visited, pruned = exhaustiveSearch(args.minsteps, args.maxsteps, args.length, args.workers)
+        print("Searched {0} prefixes ({1} pruned) in {2:.2f}s".format(visited, pruned, perf_counter() - start))
+        for gene, steps in results:
+            print("{0} {1}".format(gene, steps))
+        print("{0} satisfying gene(s) found".format(len(results)))
+    else:
+        print("Searching for satisfactory gene...")
+        geneSearch = GeneticAlgorithmGeneSearch(recursiveSolver, args.minsteps, args.maxsteps, args.workers)
+        geneSearch.geneLength = args.length
+        geneSearch.populationSize = args.population
+        geneSearch.maxGenerations = args.generations
+        result = geneSearch.run()
+        if(geneSearch.fitness(result) != 0.0):
+            print("Could not find a satisfying gene in {0} generations. Best match can be completed in {1} steps".format(geneSearch.maxGenerations, recursiveSolver.solve(result)))
+            return
+        print("Result:")
+        print(result)
+        print(recursiveSolver.solve(result))
+        if args.moves is not None:
+            saveMoves(result, args.moves)
 
     hundredTs = ['T'] * 100
     print("\nReaching the all-'G' state from an all-'T' state, for n=100 letters:\n{0}".format(recursiveSolver.solve(hundredTs)))
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
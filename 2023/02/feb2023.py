@@ -2,42 +2,57 @@
 
 import argparse
 from pathlib import Path
-from random import randint, choice, shuffle
+from random import randint, choice, shuffle, getrandbits, seed
+import multiprocessing
+import queue
+from array import array
+from collections import deque
+import tracemalloc
+import json
 import copy
+import numpy as np
 from os import path
 from datetime import datetime
+from time import perf_counter
 
 class KingSolver:
     def __init__(self, queens):
         self.n = len(queens)
         self.queens = copy.deepcopy(queens)
-    def queenThreats(self, position):
-        threatCount = 0
-        for q in self.queens:
-            if q[0] == position[0] and q[1] == position[1]:
-                continue
-            x_diff = abs(position[0] - q[0])
-            y_diff = abs(position[1] - q[1])
-            if x_diff == 0 or y_diff == 0 or x_diff == y_diff:
-                threatCount += 1
-        return threatCount
+        # time spent in each stage of evaluating the board, in seconds
+        self.timings = {'safe positions': 0.0, 'grouping': 0.0, 'arrangements': 0.0, 'totals': 0.0}
+        start = perf_counter()
+        self.buildSafeMap()
+        self.timings['safe positions'] += perf_counter() - start
+    # Build the map of 'safe' positions in one pass. The threats to a position
+    # are the numbers of queens sharing its column, row and two diagonals (no
+    # queen can share more than one of these with another position), so they 
+    # can be computed for the whole board by broadcasting the per-line queen 
+    # counts. Sets safeMask, an n x n boolean array indexed by [column, row] 
+    # that is True for positions not occupied by a queen and threatened by 
+    # exactly 2 queens, and safeColumns and safeRows, the coordinates of the 
+    # safe positions ordered by column and then row.
+    def buildSafeMap(self):
+        n = self.n
+        queens = np.array(self.queens, dtype=np.int64).reshape(-1, 2)
+        columns = queens[:, 0]
+        rows = queens[:, 1]
+        columnCounts = np.bincount(columns, minlength=n)
+        rowCounts = np.bincount(rows, minlength=n)
+        diagonalCounts = np.bincount(columns + rows, minlength=2 * n - 1)
+        antiDiagonalCounts = np.bincount(columns - rows + n - 1, minlength=2 * n - 1)
+        x = np.arange(n).reshape(n, 1)
+        y = np.arange(n).reshape(1, n)
+        threats = columnCounts[x] + rowCounts[y] + diagonalCounts[x + y] + antiDiagonalCounts[x - y + n - 1]
+        occupied = np.zeros((n, n), dtype=bool)
+        occupied[columns, rows] = True
+        self.safeMask = (threats == 2) & ~occupied
+        self.safeColumns, self.safeRows = np.nonzero(self.safeMask)
     # given the set of queen positions, list all 'safe' positions on the board
     # i.e. all positions not occupied by a queen and under threat by  exactly 
     # 2 queens.
     def safePositions(self):
-        threats = [-1] * self.n * self.n
-        for row in range(0, self.n):
-            for column in range(0, self.n):
-                pos = (column, row)
-                if pos in self.queens:
-                    continue
-                threats[row * self.n + column] = self.queenThreats(pos)
-        safe_positions = []
-        for column in range(0, self.n):
-            for row in range(0, self.n):
-                if threats[row * self.n + column] == 2:
-                    safe_positions.append((column, row))
-        return safe_positions
+        return list(zip(self.safeColumns.tolist(), self.safeRows.tolist()))
     # given the set of 'safe' positions, find spatially isolated single 
     # positions or groups of connected positions within king-threatening 
     # distance. Once we have a list of grouped positions, produce a list of 
@@ -63,192 +78,180 @@ class KingSolver:
     # arrange that number of kings.
     def safePositionGroupKingArrangementCounts(self):
         safe_positions = self.safePositions()
-        buckets = []
-        for i in range(0, len(safe_positions)):
-            assigned = False
-            for j in range(0, i):
-                x_diff = abs(safe_positions[i][0] - safe_positions[j][0])
-                y_diff = abs(safe_positions[i][1] - safe_positions[j][1])
-                if x_diff <= 1 and y_diff <= 1:
-                    # a hit
-                    for k in range(0, len(buckets)):
-                        if j in buckets[k]:
-                            assigned = True
-                            buckets[k].append(i)
-                            break
-                if assigned:
-                    break
-            if not assigned:
-                buckets.append([i])
-        # Using the bucket assignment above, it's possible for positions in a 
-        # single connected group to be assigned to multiple buckets. Perform 
-        # merges of connected groups until no more merges are possible.
-        stillMerging = True
-        while(stillMerging and len(buckets) > 1):
-            bucketsCopy = copy.deepcopy(buckets)
-            merges = 0
-            # do at most 1 merge per pass
-            for i in range(0, len(bucketsCopy)):
-                for j in range(0, len(bucketsCopy)):
-                    if j == i:
-                        continue
-                    shouldMerge = False
-                    for n in range(0, len(bucketsCopy[i])):
-                        for m in range(0, len(bucketsCopy[j])):
-                            x_diff = abs(safe_positions[bucketsCopy[i][n]][0] - safe_positions[bucketsCopy[j][m]][0])
-                            y_diff = abs(safe_positions[bucketsCopy[i][n]][1] - safe_positions[bucketsCopy[j][m]][1])
-                            if x_diff <= 1 and y_diff <= 1:
-                                shouldMerge = True
-                                break
-                        if shouldMerge:
-                            break
-                    if shouldMerge:
-                        # add elements of bucket j to elements of bucket i and 
-                        # remove bucket j
-                        bucketsCopy[i].extend(bucketsCopy[j])
-                        del bucketsCopy[j]
-                        merges += 1
-                        break
-                if merges > 0:
-                    break
-            if merges == 0:
-                stillMerging = False
-            else:
-                buckets = bucketsCopy
+        start = perf_counter()
+        buckets = self.safePositionGroups()
+        self.timings['grouping'] += perf_counter() - start
+        start = perf_counter()
         # Given the groups of safe positions, determine the number of ways to 
         # arrange different amounts of kings for each group
         safe_position_group_king_arrangements = []
         for i in range(0, len(buckets)):
-            safe_position_group_king_arrangements.append([])
-            for j in range(0, len(buckets[i]) + 1):
-                # determine the number of distinct possible j-king arrangements
-                # across the safe positions contained in bucket i and add it 
-                # to the arrangement count list.
-                group_arrangements = self.arrangementsOfKingsInPositionGroupBFS(safe_positions, buckets, i, j)
-                safe_position_group_king_arrangements[i].append(group_arrangements)
+            group_positions = [safe_positions[j] for j in buckets[i]]
+            safe_position_group_king_arrangements.append(self.kingArrangementCounts(group_positions))
         # Truncate any group king arrangement counts that have trailing zeroes
         for i in range(0, len(buckets)):
             while(safe_position_group_king_arrangements[i][len(safe_position_group_king_arrangements[i]) - 1] == 0):
                 safe_position_group_king_arrangements[i] = safe_position_group_king_arrangements[i][:-1]
+        self.timings['arrangements'] += perf_counter() - start
         return safe_position_group_king_arrangements
-    
-    # determine if a given king would threaten a given position, within an 
-    # indexed list of safe positions
-    def kingThreatensSpace(self, safe_positions, safe_position_group, king_safe_position_group_index, given_safe_position_group_index):
-        king_position = safe_positions[safe_position_group[king_safe_position_group_index]]
-        given_position = safe_positions[safe_position_group[given_safe_position_group_index]]
-        x_diff = abs(given_position[0] - king_position[0])
-        y_diff = abs(given_position[1] - king_position[1])
-        # this will indicate that a king threatens its own position, but we 
-        # aren't using this function that way
-        return (x_diff <= 1 and y_diff <= 1)
-    
-    # Use a BFS to fully examine all possible arrangements of k kings in the 
-    # given group of 'safe' positions and return the total number of distinct 
-    # arrangements.
-    def arrangementsOfKingsInPositionGroupBFS(self, safe_positions, safe_position_groups, index, k_kings):
-        # always exactly 1 way to arrange 0 kings in a group of any size, 
-        # including empty
-        if k_kings == 0:
-            return 1
-        # if the number of kings exceeds the number of positions, there's 
-        # definitely 0 ways to arrange them and we can skip further analysis
-        max_positions = len(safe_position_groups[index])
-        if max_positions < k_kings:
-            return 0
-        # state is a set of indexes of positions within the group, not the 
-        # indexes of safe positions directly
-        no_assignments = [-1] * k_kings
-        successes = set()
-        frontier = []
-        frontier_next = []
-        frontier_next.append(no_assignments)
-        
-        while(len(frontier_next) > 0):
-            frontier = copy.deepcopy(frontier_next)
-            frontier_next.clear()
-            while(len(frontier) > 0):
-                state = frontier.pop()
-                stateKey = str(state)
-                most_recent_king_state_index = -1
-                for i in range(0, len(state)):
-                    if state[i] == -1:
-                        break
-                    most_recent_king_state_index = i
-                next_king_state_index = most_recent_king_state_index + 1
-                # if we've hit an end state
-                if next_king_state_index == len(state):
-                    successes.add(stateKey)
+    # Sort the 'safe' positions into connected groups, where positions within 
+    # king-threatening distance of each other are connected. Uses a 
+    # union-find over the indexes of the safe positions, looking up 
+    # neighbouring safe positions in a grid of indexes, so it takes near-linear
+    # time in the number of safe positions. Returns a list of groups, each a 
+    # list of indexes into safePositions(), with indexes in ascending order 
+    # and groups ordered by their first index.
+    def safePositionGroups(self):
+        n = self.n
+        columns = self.safeColumns.tolist()
+        rows = self.safeRows.tolist()
+        # index of the safe position at each [column, row], or -1
+        indexes = np.full((n, n), -1, dtype=np.int64)
+        indexes[self.safeColumns, self.safeRows] = np.arange(len(columns))
+        indexes = indexes.tolist()
+        parents = list(range(0, len(columns)))
+        def find(i):
+            root = i
+            while parents[root] != root:
+                root = parents[root]
+            # path compression
+            while parents[i] != root:
+                parents[i], i = root, parents[i]
+            return root
+        for i in range(0, len(columns)):
+            column = columns[i]
+            row = rows[i]
+            # positions are ordered by column then row, so only neighbours in 
+            # the previous column or above in the same column need checking
+            for dx, dy in [(-1, -1), (-1, 0), (-1, 1), (0, -1)]:
+                x = column + dx
+                y = row + dy
+                if x < 0 or y < 0 or y >= n:
+                    continue
+                j = indexes[x][y]
+                if j < 0:
                     continue
-                # given the current state, find all remaining safe position 
-                # indexes (within the group)
-                remaining_safe_position_group_indexes = []
-                for i in range(state[most_recent_king_state_index]+1, len(safe_position_groups[index])):
-                    if i in state:
-                        continue
-                    safe = True
-                    for j in range(0, next_king_state_index):
-                        if self.kingThreatensSpace(safe_positions, safe_position_groups[index], state[j], i):
-                            safe = False
-                            break
-                    if safe:
-                        remaining_safe_position_group_indexes.append(i)
-                for i in range(0, len(remaining_safe_position_group_indexes)):
-                    nextState = copy.deepcopy(state)
-                    nextState[next_king_state_index] = remaining_safe_position_group_indexes[i]
-                    nextStateKey = str(nextState)
-                    frontier_next.append(nextState)
-        return len(successes)
+                rootI = find(i)
+                rootJ = find(j)
+                if rootI != rootJ:
+                    # keep the smaller index as the root
+                    parents[max(rootI, rootJ)] = min(rootI, rootJ)
+        groups = []
+        groupOfRoot = {}
+        for i in range(0, len(columns)):
+            root = find(i)
+            if root not in groupOfRoot:
+                groupOfRoot[root] = len(groups)
+                groups.append([])
+            groups[groupOfRoot[root]].append(i)
+        return groups
+    
+    # Count the arrangements of every number of mutually unthreatening kings 
+    # on the given positions at once, returning a list with the number of 
+    # arrangements of k kings at index k (i.e. the coefficients of the 
+    # independence polynomial of the positions' king graph). Sweeps the 
+    # positions' bounding box one cell at a time (a broken-profile DP), 
+    # column by column along its longer side. A cell's already-swept 
+    # neighbours are the cell above it and the three cells in the previous 
+    # column, so the state only needs the occupancy of the last cell swept in 
+    # each row plus the previous column's cell diagonally above, and the 
+    # counts of arrangements so far by number of kings are kept for each 
+    # such profile. The number of profiles depends only on the shorter side.
+    def kingArrangementCounts(self, positions):
+        if len(positions) == 0:
+            return [1]
+        columns = [position[0] for position in positions]
+        rows = [position[1] for position in positions]
+        minColumn, minRow = min(columns), min(rows)
+        width = max(columns) - minColumn + 1
+        height = max(rows) - minRow + 1
+        # king threats are symmetric, so transpose to keep the profile short
+        if height > width:
+            safe = set(zip([row - minRow for row in rows], [column - minColumn for column in columns]))
+            width, height = height, width
+        else:
+            safe = set(zip([column - minColumn for column in columns], [row - minRow for row in rows]))
+        # bit r of a profile is the occupancy of the last cell swept in row r,
+        # and the bit above those is the previous column's cell diagonally 
+        # above the next cell
+        diagonalBit = 1 << height
+        counts = {0: [1]}
+        for column in range(width):
+            for row in range(height):
+                rowBit = 1 << row
+                # above, diagonally above, beside and diagonally below
+                neighbours = (((7 << row) >> 1) & (diagonalBit - 1)) | (diagonalBit if row > 0 else 0)
+                isSafe = (column, row) in safe
+                nextCounts = {}
+                for profile, profileCounts in counts.items():
+                    # the cell beside this one becomes the diagonal for the 
+                    # next cell down
+                    empty = (profile & ~(rowBit | diagonalBit)) | ((profile & rowBit) << (height - row))
+                    options = [(empty, profileCounts)]
+                    if isSafe and profile & neighbours == 0:
+                        options.append((empty | rowBit, [0] + profileCounts))
+                    for nextProfile, nextProfileCounts in options:
+                        existing = nextCounts.get(nextProfile)
+                        if existing is None:
+                            nextCounts[nextProfile] = nextProfileCounts
+                        else:
+                            nextCounts[nextProfile] = self.addCounts([existing, nextProfileCounts])
+                counts = nextCounts
+        return self.addCounts(list(counts.values()))
+    # the element-wise sum of lists of counts of different lengths
+    def addCounts(self, countLists):
+        total = [0] * max(len(counts) for counts in countLists)
+        for counts in countLists:
+            for k in range(0, len(counts)):
+                total[k] += counts[k]
+        return total
+
     # Given a list of counts of distinct arrangements of k kings within each 
     # of a set of connected groups of 'safe' positions, determine the total 
-    # number of distinct ways to arrange any number of kings on safe spaces on
-    # this board. Uses a recursive DFS to examine all possible distributions 
-    # of kings between the grouped positions, but exits early if the total 
-    # ever exceeds a target value.
-    def totalKingArrangements(self, safe_position_group_arrangements, group_index, choices, total_arrangements_target):
-        # if we've reached a leaf of the tree
-        if group_index == len(safe_position_group_arrangements):
-            product = 1
-            kings = 0
-            for i in range(0, len(safe_position_group_arrangements)):
-                product *= safe_position_group_arrangements[i][choices[i]]
-                kings += choices[i]
-            if kings == self.n:
-                return product, True
-            else:
-                return 0, True
-        nodesum = 0
-        # determine the maximum possible kings that can be assigned to 
-        # subsequent groups and the number of kings that have been previously 
-        # assigned
-        current_kings = 0
-        for i in range(0, group_index):
-            current_kings += choices[i]
-        remaining_max = 0
-        for i in range(group_index + 1, len(safe_position_group_arrangements)):
-            remaining_max += len(safe_position_group_arrangements[i]) - 1
-        for i in range(0, len(safe_position_group_arrangements[group_index])):
-            # if the previous choices plus this one can't possibly reach n 
-            # kings ignore the branch
-            if(current_kings + i + remaining_max < self.n):
-                continue
-            nextChoices = copy.deepcopy(choices)
-            nextChoices.append(i)
-            branchVal, branchOk = self.totalKingArrangements(safe_position_group_arrangements, group_index + 1, nextChoices, total_arrangements_target)
-            nodesum += branchVal
-            if(nodesum > total_arrangements_target or not branchOk):
-                return nodesum, False
-        return nodesum, True
+    # number of distinct ways to arrange n kings on safe spaces on this board.
+    # Each group's counts are the coefficients of a polynomial in the number 
+    # of kings, and since groups are independent the total is the coefficient 
+    # of x^n in the product of the polynomials, which is found by multiplying 
+    # them one at a time, discarding terms above x^n.
+    # If a target is given, coefficients are capped at one more than the 
+    # target. Every group has exactly one arrangement of 0 kings, so 
+    # coefficients never decrease as groups are multiplied in and a capped 
+    # coefficient that contributes to x^n at all means the total exceeds the 
+    # target. The product is abandoned as soon as the x^n coefficient exceeds 
+    # the target. Returns the total (or a lower bound on it if the target 
+    # was exceeded), and whether the target was not exceeded.
+    def totalKingArrangements(self, safe_position_group_arrangements, total_arrangements_target = None):
+        n = self.n
+        cap = None if total_arrangements_target is None else total_arrangements_target + 1
+        product = [1]
+        for counts in safe_position_group_arrangements:
+            degree = min(n, len(product) + len(counts) - 2)
+            nextProduct = [0] * (degree + 1)
+            for i in range(0, len(product)):
+                if product[i] == 0:
+                    continue
+                for j in range(0, min(len(counts), degree - i + 1)):
+                    nextProduct[i + j] += product[i] * counts[j]
+            if cap is not None:
+                for k in range(0, len(nextProduct)):
+                    if nextProduct[k] > cap:
+                        nextProduct[k] = cap
+                if len(nextProduct) > n and nextProduct[n] > total_arrangements_target:
+                    return nextProduct[n], False
+            product = nextProduct
+        if len(product) <= n:
+            return 0, True
+        return product[n], True
     def satisfiesTarget(self, targetDistinctKingArrangements):
-        safePositions = self.safePositions()
         groupKingCounts = self.safePositionGroupKingArrangementCounts()
-        amount,ok = self.totalKingArrangements(groupKingCounts, 0, [], targetDistinctKingArrangements)
+        start = perf_counter()
+        amount,ok = self.totalKingArrangements(groupKingCounts, targetDistinctKingArrangements)
+        self.timings['totals'] += perf_counter() - start
         return (amount == targetDistinctKingArrangements and ok)
     def zeroPossibleNKings(self):
         # there are zero possible ways to arrange n kings if the sum of the 
         # maximum number of kings that can be arranged in each grouping of 
         # 'safe' positions is less than n.
-        safePositions = self.safePositions()
         groupKingCounts = self.safePositionGroupKingArrangementCounts()
         total = 0
         for g in groupKingCounts:
@@ -256,26 +259,22 @@ class KingSolver:
         return total < self.n
         
 class QueenGenerator:
-    def __init__(self, n):
+    def __init__(self, n, maxVisited = 100000):
         self.n = n
-    # returns the number of threats from queens to a given position. 
-    def positionThreat(self, queens, position):
-        threatCount = 0
-        for q in queens:
-            if q[0] == position[0] and q[1] == position[1]:
-                continue
-            x_diff = abs(position[0] - q[0])
-            y_diff = abs(position[1] - q[1])
-            if x_diff == 0 or y_diff == 0 or x_diff == y_diff:
-                threatCount += 1
-        return threatCount
-    def solved(self, queens):
-        worst_threat = 0
-        for i in range(0, len(queens)):
-            threat = self.positionThreat(queens, queens[i])
-            if threat > worst_threat:
-                worst_threat = threat
-        return worst_threat == 0
+        # Zobrist hashing of queen arrangements: a random 64-bit key for each
+        # position, with an arrangement hashed as the XOR of the keys of its 
+        # queens, so moving a queen updates the hash with two XORs.
+        self.zobristKeys = array('Q', [getrandbits(64) for i in range(0, n * n)])
+        # the maximum number of arrangement hashes remembered in each attempt,
+        # with the oldest forgotten first
+        self.maxVisited = maxVisited
+        # buffers reused by every move
+        self.bestRows = []
+        self.threatened = []
+        # report allocations made by each attempt's repair loop
+        self.trackAllocations = False
+        self.allocatedBytes = 0
+        self.peakAllocatedBytes = 0
     # generates a single n-queen arrangement using iterative repair.
     # this may require multiple attempts and is not guaranteed to reach a 
     # solution.
@@ -297,95 +296,419 @@ class QueenGenerator:
             return False
         return solution
     
+    # Place, remove or count threats for a queen at (column, row) using 
+    # per-row and per-diagonal occupancy counts, so that each is O(1). There is
+    # always exactly one queen per column, so columns need no counts.
+    def placeQueen(self, column, row):
+        self.rowCounts[row] += 1
+        self.diagonalCounts[column + row] += 1
+        self.antiDiagonalCounts[column - row + self.n - 1] += 1
+    def removeQueen(self, column, row):
+        self.rowCounts[row] -= 1
+        self.diagonalCounts[column + row] -= 1
+        self.antiDiagonalCounts[column - row + self.n - 1] -= 1
+    # the number of queens in other columns threatening (column, row), not 
+    # counting a queen at that position itself
+    def lineThreat(self, column, row, occupied):
+        threat = self.rowCounts[row] + self.diagonalCounts[column + row] + self.antiDiagonalCounts[column - row + self.n - 1]
+        if occupied:
+            threat -= 3
+        return threat
+    # the rows in the given column with the fewest threats, excluding the 
+    # column's own queen. The returned list is reused by the next call.
+    def leastThreatenedRows(self, column):
+        best = -1
+        bestRows = self.bestRows
+        bestRows.clear()
+        for row in range(0, self.n):
+            threat = self.lineThreat(column, row, False)
+            if best == -1 or threat < best:
+                best = threat
+                bestRows.clear()
+                bestRows.append(row)
+            elif threat == best:
+                bestRows.append(row)
+        return bestRows
+    # move the queen in a column to a new row in place, returning the updated
+    # arrangement hash. Moving it back undoes the move.
+    def moveQueen(self, rows, column, row, stateHash):
+        n = self.n
+        self.removeQueen(column, rows[column])
+        stateHash ^= self.zobristKeys[column * n + rows[column]] ^ self.zobristKeys[column * n + row]
+        rows[column] = row
+        self.placeQueen(column, row)
+        return stateHash
+
     # returns a list of tuples giving the coordinates of n queens, or False 
     # if no solution can be found within maxMoves.
+    # Uses the min-conflicts heuristic: queens are placed one per column, 
+    # each in the least threatened row given the queens placed so far, then 
+    # until no queen is threatened a randomly chosen threatened queen is moved 
+    # to the least threatened row in its column. Threats are tracked with 
+    # row and diagonal occupancy counts that are updated in O(1) per move.
+    # Moves are made in place on a row-per-column list, and the Zobrist hashes 
+    # of recently visited arrangements are kept so that the search prefers 
+    # moves to arrangements it hasn't seen, rather than cycling.
     def generateQueens(self, maxMoves, verbose=False):
-        max_attempts = 50
-        # initialize queen positions to a random column, 1 per row
-        n = self.n;
-        queens = []
+        n = self.n
+        self.rowCounts = [0] * n
+        self.diagonalCounts = [0] * (2 * n - 1)
+        self.antiDiagonalCounts = [0] * (2 * n - 1)
+        # the row of the queen in each column
+        rows = [0] * n
+        stateHash = 0
+        # initialize queen positions to 1 per column in the least threatened 
+        # rows, visiting the columns in random order
+        columns = list(range(0, n))
+        shuffle(columns)
+        for column in columns:
+            rows[column] = choice(self.leastThreatenedRows(column))
+            self.placeQueen(column, rows[column])
+            stateHash ^= self.zobristKeys[column * n + rows[column]]
         seen = set()
-        # initialize queen positions to 1 per column in random rows
-        for i in range(0, n):
-            queens.append([i,randint(0, n - 1)])
-        finished = False;
+        seenOrder = deque()
+        threatened = self.threatened
+        if self.trackAllocations:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            startAllocated = tracemalloc.get_traced_memory()[0]
+        finished = False
         moves = 0
-        # Find the most-threatened queen that can be moved to a less 
-        # threatened position in the same column, maximizing the reduction in 
-        # threat, such that we do not repeat a queen arrangement that has been 
-        # previously seen.
-        # Exit if the number of attempted moves exceeds maxMoves and a 
-        # solution has not been found.
         while not finished:
-            stateKey = str(queens)
-            seen.add(stateKey)
+            if stateHash not in seen:
+                seen.add(stateHash)
+                seenOrder.append(stateHash)
+                if len(seenOrder) > self.maxVisited:
+                    seen.discard(seenOrder.popleft())
             if verbose:
-                print("Move {}:\t{}".format(moves, queens))
-            if self.solved(queens):
+                print("Move {}:\t{}".format(moves, [[column, rows[column]] for column in range(0, n)]))
+            threatened.clear()
+            for column in range(0, n):
+                if self.lineThreat(column, rows[column], True) > 0:
+                    threatened.append(column)
+            if len(threatened) == 0:
                 finished = True
                 break
             if moves > maxMoves:
                 break
-            candidates = []
-            for q in queens:
-                # no need to consider safe queens
-                queenThreat = self.positionThreat(queens, q)
-                if queenThreat == 0:
-                    continue
-                # consider each space in the same column as a possible 
-                # destination for the queen
-                for i in range(0,self.n):
-                    if i == q[1]:
-                        continue
-                    # minus 1 to exclude the threat from the queen in the same 
-                    # column
-                    positionThreat = self.positionThreat(queens, [q[0], i]) - 1
-                    # record the candidate position and difference between the
-                    # threat to the current queen position and the threat to
-                    # the candidate position.
-                    # no need to consider candidate positions that are worse.
-                    if positionThreat < queenThreat:
-                        candidates.append((q[0], i, queenThreat - positionThreat))
-            # given a list of candidates, sort from best to worst improvement
-            sorted_candidates = sorted(candidates, key=lambda c: c[2], reverse=True)
+            column = choice(threatened)
+            previousRow = rows[column]
+            self.removeQueen(column, previousRow)
+            bestRows = self.leastThreatenedRows(column)
+            self.placeQueen(column, previousRow)
+            # try the least threatened rows from a random starting point until
+            # one leads to an unseen arrangement, undoing the others
+            offset = randint(0, len(bestRows) - 1)
             moveFound = False
-            # try candidate moves in sorted order until a state that hasn't been 
-            # previously tried is found. If no move is found, this attempt has 
-            # failed.
-            for c in sorted_candidates:
-                nextQueens = copy.deepcopy(queens)
-                nextQueens[c[0]] = [c[0], c[1]]
-                nextQueensKey = str(nextQueens)
-                if nextQueensKey not in seen:
-                    if verbose:
-                        print("\tMoving queen from {} to {}".format(queens[c[0]], nextQueens[c[0]]))
-                    queens = nextQueens
+            for i in range(0, len(bestRows)):
+                row = bestRows[(offset + i) % len(bestRows)]
+                if row == previousRow:
+                    continue
+                stateHash = self.moveQueen(rows, column, row, stateHash)
+                if stateHash not in seen:
                     moveFound = True
                     break
+                stateHash = self.moveQueen(rows, column, previousRow, stateHash)
             if not moveFound:
-                if verbose:
-                    print("\tNo possible moves found.")
-                break
+                # every best move revisits an arrangement, so make a random 
+                # move in the column to break out of the cycle
+                row = randint(0, n - 1)
+                stateHash = self.moveQueen(rows, column, row, stateHash)
+            if verbose and rows[column] != previousRow:
+                print("\tMoving queen from {} to {}".format([column, previousRow], [column, rows[column]]))
             moves += 1
+        if self.trackAllocations:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.allocatedBytes = current - startAllocated
+            self.peakAllocatedBytes = peak - startAllocated
         if(finished):
-            # return positions as a list of tuples, rather than a list of lists
-            return list(map(lambda q: (q[0], q[1]), queens))
+            # return positions as a list of tuples
+            return [(column, rows[column]) for column in range(0, n)]
         else:
             return False
 
+# Reduce a queen arrangement to a canonical form under the 8 symmetries of 
+# the square (rotations and reflections), which all give the same safe 
+# positions up to the same symmetry and so the same king arrangement counts. 
+# Each form is a tuple of the row of the queen in each column, and the 
+# lexicographically smallest is chosen.
+def canonicalQueens(queens):
+    n = len(queens)
+    m = n - 1
+    transforms = [
+        lambda x, y: (x, y),
+        lambda x, y: (m - x, y),
+        lambda x, y: (x, m - y),
+        lambda x, y: (m - x, m - y),
+        lambda x, y: (y, x),
+        lambda x, y: (m - y, x),
+        lambda x, y: (y, m - x),
+        lambda x, y: (m - y, m - x),
+    ]
+    forms = []
+    for transform in transforms:
+        rows = [0] * n
+        for q in queens:
+            column, row = transform(q[0], q[1])
+            rows[column] = row
+        forms.append(tuple(rows))
+    return min(forms)
+
+# Persistent cache of evaluated queen arrangements, keyed on the problem 
+# (main or bonus) and the canonical form of the arrangement. Results are kept
+# in memory and appended to a JSON-lines file as they are recorded, and any 
+# existing file is loaded on startup so that long or repeated runs skip 
+# arrangements that have already been tested.
+class ResultCache:
+    def __init__(self, cachepath):
+        self.cachepath = cachepath
+        self.results = {}
+        if path.exists(cachepath):
+            f = open(cachepath, "r")
+            for line in f:
+                line = line.strip()
+                if len(line) == 0:
+                    continue
+                entry = json.loads(line)
+                self.results[(entry['bonus'], tuple(entry['queens']))] = entry['satisfied']
+            f.close()
+        self.file = open(cachepath, "a")
+    # returns the cached result for an arrangement in canonical form, or None 
+    # if it has not been tested
+    def lookup(self, bonus, board):
+        return self.results.get((bonus, board))
+    # record the result for an arrangement in canonical form. Returns False if
+    # it was already recorded.
+    def record(self, bonus, board, satisfied):
+        key = (bonus, board)
+        if key in self.results:
+            return False
+        self.results[key] = satisfied
+        self.file.write(json.dumps({'bonus': bonus, 'queens': list(board), 'satisfied': satisfied}) + '\n')
+        self.file.flush()
+        return True
+    def close(self):
+        self.file.close()
+
 def saveOutput(outputdir, filename, output):
     outputpath = path.join(outputdir, filename)
     f = open(outputpath, "a")
     f.write(str(output) + '\n')
     f.close()
 
+# Report the throughput of generating n-queen arrangements
+def queenBenchmark(n, count):
+    print("Generating {} {}-queen arrangement(s)...".format(count, n))
+    queenGenerator = QueenGenerator(n)
+    start = perf_counter()
+    generated = 0
+    for i in range(0, count):
+        if queenGenerator.solve(20, 10 * n, False) != False:
+            generated += 1
+    elapsed = perf_counter() - start
+    print("{} arrangement(s) generated in {:.3f}s ({:.1f} per second, {:.3f}ms each)".format(generated, elapsed, generated / elapsed, 1000 * elapsed / max(1, generated)))
+    # repeat a few attempts with allocation tracking, which is too slow to 
+    # leave on for the timing above
+    queenGenerator.trackAllocations = True
+    for i in range(0, min(count, 5)):
+        queenGenerator.generateQueens(10 * n, False)
+        print("Attempt {}: repair loop allocated {} bytes net, {} bytes peak".format(i + 1, queenGenerator.allocatedBytes, queenGenerator.peakAllocatedBytes))
+
+# maximum attempt parameters for using iterative repair to generate n-queen 
+# arrangements
+maxQueenAttempts = 20
+maxQueenMovesPerAttempt = 250
+# the number of king arrangements required for the main problem
+targetKingArrangements = 48
+
+# Test a queen arrangement for the main problem (exactly 48 ways to arrange 
+# n mutually unthreatening kings in the 'safe' positions) or the bonus 
+# problem (no ways to arrange n kings). Returns whether the arrangement 
+# satisfies the problem and the time spent in each stage of evaluating it.
+def evaluateQueens(queens, bonus):
+    kingSolver = KingSolver(queens)
+    if bonus:
+        satisfied = kingSolver.zeroPossibleNKings()
+    else:
+        satisfied = kingSolver.satisfiesTarget(targetKingArrangements)
+    return satisfied, kingSolver.timings
+
+# file in the output directory that satisfying arrangements are appended to
+solutionsFilename = 'solutions.jsonl'
+# file in the output directory holding the cache of tested arrangements
+cacheFilename = 'cache.jsonl'
+
+# Report a satisfying arrangement and append it to the solutions file in the
+# output directory
+def recordSolution(queens, board, bonus, outputdir):
+    print("Satisfying arrangement found! ")
+    print(queens)
+    entry = {'found': datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'problem': 'bonus' if bonus else 'main', 'queens': queens, 'canonical': list(board)}
+    saveOutput(outputdir, solutionsFilename, json.dumps(entry))
+    print("Saving result to {}".format(path.join(outputdir, solutionsFilename)))
+
+# Until maxattempts is exceeded or target solutions have been found (if 
+# target is non-zero), generate an n-queen arrangement and test if it 
+# satisfies the main or bonus problem, one at a time. Arrangements 
+# equivalent to one already in the cache are not re-evaluated, and only 
+# solutions not previously found are recorded. Returns the number of new 
+# solutions found, the number of arrangements tested and the number of those
+# answered from the cache.
+def searchSerially(n, bonus, maxattempts, target, outputdir, cache, timings):
+    queenGenerator = QueenGenerator(n)
+    successes = 0
+    attempts = 0
+    cacheHits = 0
+    for i in range(0, maxattempts):
+        print("Attempt {}/{}".format(i + 1, maxattempts))
+        queens = False
+        start = perf_counter()
+        while queens == False:
+            queens = queenGenerator.solve(maxQueenAttempts, maxQueenMovesPerAttempt, False)
+        timings['queens'] += perf_counter() - start
+        attempts += 1
+        board = canonicalQueens(queens)
+        if cache.lookup(bonus, board) is not None:
+            cacheHits += 1
+            continue
+        satisfied, boardTimings = evaluateQueens(queens, bonus)
+        for stage in boardTimings:
+            timings[stage] += boardTimings[stage]
+        cache.record(bonus, board, satisfied)
+        if satisfied:
+            recordSolution(queens, board, bonus, outputdir)
+            successes += 1
+            if target > 0 and successes >= target:
+                break
+    return successes, attempts, cacheHits
+
+# Producer process for the parallel search: generate n-queen arrangements and
+# put them on the board queue until told to stop.
+def queenProducer(n, boardQueue, stopEvent, generated, generatingTime):
+    # forked processes inherit the parent's random state, so reseed
+    seed()
+    queenGenerator = QueenGenerator(n)
+    while not stopEvent.is_set():
+        start = perf_counter()
+        queens = queenGenerator.solve(maxQueenAttempts, maxQueenMovesPerAttempt, False)
+        with generatingTime.get_lock():
+            generatingTime.value += perf_counter() - start
+        if queens == False:
+            continue
+        with generated.get_lock():
+            generated.value += 1
+        while not stopEvent.is_set():
+            try:
+                boardQueue.put(queens, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+# Consumer process for the parallel search: test arrangements from the board 
+# queue and put the results on the result queue until told to stop. 
+# cachedResults is the contents of the result cache when the search started;
+# arrangements found there or already tested by this consumer are passed on 
+# with no timings rather than re-evaluated.
+def boardConsumer(bonus, boardQueue, resultQueue, stopEvent, cachedResults):
+    testedResults = {}
+    while not stopEvent.is_set():
+        try:
+            queens = boardQueue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        board = canonicalQueens(queens)
+        if (bonus, board) in cachedResults or board in testedResults:
+            resultQueue.put((queens, board, False, None))
+            continue
+        satisfied, boardTimings = evaluateQueens(queens, bonus)
+        testedResults[board] = satisfied
+        resultQueue.put((queens, board, satisfied, boardTimings))
+
+# The same search as searchSerially, with arrangements generated by producer 
+# processes and tested by consumer processes, connected by a bounded queue. 
+# Prints a periodic summary of throughput, and stops all processes once 
+# maxattempts arrangements have been tested or target solutions found.
+def searchInParallel(n, bonus, maxattempts, target, workers, outputdir, cache, timings):
+    # generating an arrangement takes somewhat longer than testing one
+    producerCount = max(1, (workers * 2) // 3)
+    consumerCount = max(1, workers - producerCount)
+    print("Searching with {} producer and {} consumer process(es)".format(producerCount, consumerCount))
+    boardQueue = multiprocessing.Queue(maxsize = 4 * workers)
+    resultQueue = multiprocessing.Queue()
+    stopEvent = multiprocessing.Event()
+    generated = multiprocessing.Value('l', 0)
+    generatingTime = multiprocessing.Value('d', 0.0)
+    processes = []
+    for i in range(0, producerCount):
+        processes.append(multiprocessing.Process(target=queenProducer, args=(n, boardQueue, stopEvent, generated, generatingTime)))
+    for i in range(0, consumerCount):
+        processes.append(multiprocessing.Process(target=boardConsumer, args=(bonus, boardQueue, resultQueue, stopEvent, cache.results)))
+    for process in processes:
+        process.start()
+    successes = 0
+    attempts = 0
+    cacheHits = 0
+    start = perf_counter()
+    lastReport = start
+    try:
+        while attempts < maxattempts and (target == 0 or successes < target):
+            try:
+                queens, board, satisfied, boardTimings = resultQueue.get(timeout=0.5)
+            except queue.Empty:
+                queens = None
+            if queens is not None:
+                attempts += 1
+                # consumers only know the cache as it was at the start, so 
+                # an equivalent arrangement may have been recorded since
+                if boardTimings is None or not cache.record(bonus, board, satisfied):
+                    cacheHits += 1
+                    continue
+                for stage in boardTimings:
+                    timings[stage] += boardTimings[stage]
+                if satisfied:
+                    recordSolution(queens, board, bonus, outputdir)
+                    successes += 1
+            now = perf_counter()
+            if now - lastReport >= 5.0:
+                elapsed = now - start
+                print("{:.0f}s: {} arrangement(s) generated ({:.1f}/s), {} tested ({:.1f}/s), {} solution(s)".format(elapsed, generated.value, generated.value / elapsed, attempts, attempts / elapsed, successes))
+                lastReport = now
+    finally:
+        # stop the workers, draining the queues so that none of them are left 
+        # blocked on a full queue
+        stopEvent.set()
+        for process in processes:
+            while process.is_alive():
+                for pending in [boardQueue, resultQueue]:
+                    try:
+                        while True:
+                            pending.get_nowait()
+                    except queue.Empty:
+                        pass
+                process.join(timeout=0.1)
+    elapsed = perf_counter() - start
+    timings['queens'] += generatingTime.value
+    print("{} arrangement(s) generated and {} tested in {:.1f}s ({:.1f} generated/s, {:.1f} tested/s)".format(generated.value, attempts, elapsed, generated.value / elapsed, attempts / elapsed))
+    return successes, attempts, cacheHits
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("outputdir", help="The directory to store successful solutions")
+    parser.add_argument("outputdir", nargs="?", help="The directory to store successful solutions")
     parser.add_argument("-b", "--bonus", action="store_true", help="Attempt to solve the bonus problem for 26 queens")
     parser.add_argument("-m", "--maxattempts", default=100, type=int, help="Maximum number of solutions to attempt")
+    parser.add_argument("-w", "--workers", default=1, type=int, help="Number of worker processes generating and testing queen arrangements")
+    parser.add_argument("-t", "--target", default=0, type=int, help="Stop once this many matching solutions have been found (0 for no limit)")
+    parser.add_argument("-q", "--queenbenchmark", default=0, type=int, help="Benchmark generating queen arrangements of this size and exit")
     args = parser.parse_args()
+    if args.queenbenchmark > 0:
+        queenBenchmark(args.queenbenchmark, args.maxattempts)
+        return
     outputdir = args.outputdir
+    if outputdir is None:
+        print("No output directory specified")
+        parser.print_usage()
+        exit()
     if(not path.isdir(outputdir) or  not path.exists(outputdir)):
         print("Output directory '{}' could not be found".format(outputdir))
         parser.print_usage()
@@ -394,64 +717,34 @@ def main():
         print("Specified attempts too small: {}".format(args.maxattempts))
         parser.print_usage()
         exit()
+    if args.workers < 1:
+        print("Specified workers too small: {}".format(args.workers))
+        parser.print_usage()
+        exit()
+    if args.target < 0:
+        print("Specified target too small: {}".format(args.target))
+        parser.print_usage()
+        exit()
     print("\n######## Ponder This Challenge - February 2023 ########\n")
     if(args.bonus):
         print("Bonus problem: Attempting to find 26-queen solutions that permit no placements\nof 26 kings on 'safe' positions.")
     else:
         print("Attempting to find 20-queen solutions that permit exactly 48 possible\nplacements of 20 kings on 'safe' positions.")
     print("A maximum of {} queen arrangement(s) will be generated and tested.".format(args.maxattempts))
-    print("Satisfying queen arrangements will be saved to the directory '{}'".format(args.outputdir))
-    # maximum attempt parameters for using iterative repair to generate n-queen 
-    # arrangements
-    maxQueenAttempts = 20
-    maxQueenMovesPerAttempt = 250
-    successes = 0
-    if(args.bonus):
-        n = 26
-        queenGenerator = QueenGenerator(n)
-        queens = False
-        # until maxattempts is exceeded, generate a 26 queen arrangement and 
-        # test if it has no possible ways to arrange 26 mutually 
-        # unthreatening kings in the 'safe' positions.
-        # If an arrangement satisfies the condition, save it to a text file in 
-        # the output directory.
-        for i in range(0, args.maxattempts):
-            print("Attempt {}/{}".format(i + 1, args.maxattempts))
-            queens = False
-            
-            while queens == False:
-                queens = queenGenerator.solve(maxQueenAttempts, maxQueenMovesPerAttempt, False)
-            kingSolver = KingSolver(queens)
-            if kingSolver.zeroPossibleNKings():
-                print("Satisfying arrangement found! ".format(n))
-                print(queens)
-                outputfilename = datetime.now().strftime('%Y_%m_%d__%H_%M_%S_BONUS.txt')
-                saveOutput(outputdir, outputfilename, str(queens))
-                print("Saving result to {}".format(path.join(outputdir, outputfilename)))
-                successes += 1
+    print("Satisfying queen arrangements will be appended to '{}'".format(path.join(args.outputdir, solutionsFilename)))
+    n = 26 if args.bonus else 20
+    # total time spent generating queen arrangements and in each stage of 
+    # evaluating them
+    timings = {'queens': 0.0, 'safe positions': 0.0, 'grouping': 0.0, 'arrangements': 0.0, 'totals': 0.0}
+    cache = ResultCache(path.join(outputdir, cacheFilename))
+    print("Loaded {} previously tested arrangement(s) from the cache".format(len(cache.results)))
+    if args.workers > 1:
+        successes, attempts, cacheHits = searchInParallel(n, args.bonus, args.maxattempts, args.target, args.workers, outputdir, cache, timings)
     else:
-        n = 20
-        targetKingArrangements = 48
-        queenGenerator = QueenGenerator(n)
-        queens = False
-        # until maxattempts is exceeded, generate a 20 queen arrangement and 
-        # test if it has 48 possible ways to arrange 20 mutually unthreatening 
-        # kings in the 'safe' positions.
-        # If an arrangement satisfies the condition, save it to a text file in 
-        # the output directory.
-        for i in range(0, args.maxattempts):
-            print("Attempt {}/{}".format(i + 1, args.maxattempts))
-            queens = False
-            while queens == False:
-                queens = queenGenerator.solve(maxQueenAttempts, maxQueenMovesPerAttempt, False)
-            kingSolver = KingSolver(queens)
-            if kingSolver.satisfiesTarget(targetKingArrangements):
-                print("Satisfying arrangement found! ".format(n))
-                print(queens)
-                outputfilename = datetime.now().strftime('%Y_%m_%d__%H_%M_%S_MAIN.txt')
-                saveOutput(outputdir, outputfilename, str(queens))
-                print("Saving result to {}".format(path.join(outputdir, outputfilename)))
-                successes += 1
-    print("{} matching queen solution(s) found in {} attempts".format(successes, args.maxattempts))
+        successes, attempts, cacheHits = searchSerially(n, args.bonus, args.maxattempts, args.target, outputdir, cache, timings)
+    cache.close()
+    print("{} new matching queen solution(s) found in {} attempts ({} answered from the cache)".format(successes, attempts, cacheHits))
+    print("Time spent: " + ", ".join("{} {:.3f}s".format(stage, timings[stage]) for stage in timings))
     
-main()
+if __name__ == "__main__":
+    main()
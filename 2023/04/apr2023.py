@@ -1,11 +1,13 @@
 # https://research.ibm.com/haifa/ponderthis/challenges/April2023.html
 
 import argparse
-from random import randrange
-import copy
+from random import randrange, getrandbits, random, seed
+import multiprocessing
+import queue
 from os import path
+from time import perf_counter
 
-def initializeBulbGrid(lines):
+def initializeBulbGrid(lines, solver = 'auto'):
     if len(lines) == 0:
         print("Supplied bulb grid is empty")
         return None
@@ -14,47 +16,129 @@ def initializeBulbGrid(lines):
         if len(lines) != len(stripped_line):
             print("Supplied bulb grid is not square")
             return None
-        # not rigorously verified, but the transformation matrices for 
-        # odd-dimensioned bulb grids seem to all be non-involutory so our 
-        # solution doesn't work. The matrices might still be invertable.
-        if len(lines) % 2 != 0:
-            print("Supplied bulb grid has dimensions {} x {}. Bulb grids with even dimensions are required".format( len(lines), len(lines)))
+        # the transformation matrices for odd-dimensioned bulb grids are not 
+        # involutory, so those grids need the elimination solver
+        if len(lines) % 2 != 0 and solver == 'parity':
+            print("Supplied bulb grid has dimensions {} x {}. The parity solver requires even dimensions".format( len(lines), len(lines)))
             return None
         for j in range(0, len(stripped_line)):
             if stripped_line[j] != '0' and stripped_line[j] != '1':
                 print("Supplied bulb grid has an invalid character '{}' on line {} column {}".format(stripped_line[j], i + 1, j + 1))
                 return None
-    return BulbGrid(lines)
+    return BulbGrid(lines, solver)
+
+# Solve a system of linear equations over GF(2) by Gauss-Jordan elimination. 
+# Each equation is packed into an int, with bit i the coefficient of variable
+# i for i < count and bit count the right-hand side. Returns None if the 
+# system is inconsistent, otherwise a particular solution packed into an int 
+# and a basis for the kernel as a list of packed ints.
+def solve_gf2(equations, count):
+    rows = list(equations)
+    pivots = []
+    for column in range(0, count):
+        bit = 1 << column
+        pivot = None
+        for i in range(len(pivots), len(rows)):
+            if rows[i] & bit:
+                pivot = i
+                break
+        if pivot is None:
+            continue
+        rank = len(pivots)
+        rows[rank], rows[pivot] = rows[pivot], rows[rank]
+        for i in range(0, len(rows)):
+            if i != rank and rows[i] & bit:
+                rows[i] ^= rows[rank]
+        pivots.append(column)
+    # any remaining rows have no coefficients left, so a set right-hand side
+    # is the equation 0 = 1
+    for i in range(len(pivots), len(rows)):
+        if rows[i] != 0:
+            return None
+    solution = 0
+    for i in range(0, len(pivots)):
+        if (rows[i] >> count) & 1:
+            solution |= 1 << pivots[i]
+    kernel = []
+    pivot_columns = set(pivots)
+    for free in range(0, count):
+        if free in pivot_columns:
+            continue
+        vector = 1 << free
+        for i in range(0, len(pivots)):
+            if (rows[i] >> free) & 1:
+                vector |= 1 << pivots[i]
+        kernel.append(vector)
+    return solution, kernel
+    
+# The state of a bulb grid as moves are made, with each row of bulbs packed 
+# into an int (bit x is the bulb in column x). Selecting a bulb toggles its 
+# entire row and column, which is recorded as a flip of the row and a flip of 
+# the column rather than by updating every affected bulb, so a move takes O(1)
+# time. The selected bulb itself is covered by both flips and so has its own 
+# bit toggled once more to leave it toggled exactly once.
+class BulbState:
+    def __init__(self, n, rows):
+        self.n = n
+        self.full = (1 << n) - 1
+        self.rows = list(rows)
+        self.row_flips = [0] * n
+        self.column_flips = 0
+    
+    def lit(self, x, y):
+        return ((self.rows[y] >> x) & 1) ^ self.row_flips[y] ^ ((self.column_flips >> x) & 1)
+    
+    def select(self, x, y):
+        self.row_flips[y] ^= 1
+        self.column_flips ^= 1 << x
+        self.rows[y] ^= 1 << x
     
+    # the current state of row y, packed into an int
+    def row(self, y):
+        return self.rows[y] ^ self.column_flips ^ (self.full if self.row_flips[y] else 0)
+
 class BulbGrid:
-    def __init__(self, lines):
+    # grids up to this size have their minimal-weight solution found by 
+    # exhaustive search over the solution space in the elimination solver
+    exhaustive_limit = 15
+    # number of random restarts of the local search for minimal-weight 
+    # solutions on larger grids
+    local_search_restarts = 20
+
+    def __init__(self, lines, solver = 'auto'):
         self.n = len(lines)
         self.n2 = self.n * self.n
-        self.transforms = self.all_transforms()
-        self.initial_state = []
+        self.full = (1 << self.n) - 1
+        # the initial state with each row packed into an int, bit x set if the
+        # bulb in column x is lit
+        self.rows = []
         for i in range(0, len(lines)):
             # flip the vertical coordinates. (0,0) is the bottom-left corner, not top-left
-            line = lines[len(lines) - i - 1]
-            for j in range(0, len(line)):
-                if line[j] == '\n':
-                    continue
-                if line[j] == '0':
-                    self.initial_state.append(0)
-                else:
-                    self.initial_state.append(1)
-        self.moves = self.required_transforms()
+            line = lines[len(lines) - i - 1].strip()
+            # the leftmost bulb is the lowest bit
+            self.rows.append(int(line[::-1], 2))
+        if solver == 'auto':
+            solver = 'parity' if self.n % 2 == 0 else 'elimination'
+        # whether the grid can be fully lit, the dimension of the space of 
+        # solutions and whether self.moves is known to be the smallest 
+        # solution in that space
+        self.solvable = True
+        self.kernel_dimension = 0
+        self.minimal = True
+        if solver == 'parity':
+            self.moves = self.required_transforms()
+        else:
+            self.moves = self.eliminated_transforms()
         
     def print_grid(self, moves = []):
-        state = copy.deepcopy(self.initial_state)
+        state = BulbState(self.n, self.rows)
         for move in moves:
             # don't bother checking for illegal moves here
-            for i in range(0, self.n2):
-                state[i] ^= self.transforms[move][i]
+            state.select(move % self.n, move // self.n)
         for y in range(0, self.n):
-            for x in range(0, self.n):
-                # flip the vertical coordinates back for display
-                print("{} ".format(state[((self.n - 1 - y) * self.n) + x]), end="")
-            print()
+            # flip the vertical coordinates back for display
+            row = state.row(self.n - 1 - y)
+            print(" ".join(str((row >> x) & 1) for x in range(0, self.n)) + " ")
     
     # Assuming the matrix of transformations is self-inverting, we multiply it 
     # by the vector of net transforms needed to reach an all '1' state. 
@@ -65,69 +149,232 @@ class BulbGrid:
     # coefficients is made exactly once and all moves with zero coefficients 
     # are not made. Returns the indexes of all moves with non-zero 
     # coefficients.
+    #
+    # Row j of the matrix is the mask of bulbs sharing a row or column with 
+    # bulb j, so coefficient j of the product is the parity of the net 
+    # transform over the row of bulb j, plus the parity over its column, plus 
+    # the net transform at bulb j itself (which is counted in both parities).
+    # This is computed directly from the packed rows in O(n^2) time without 
+    # building the n^2 x n^2 matrix.
     def required_transforms(self):
         net_transform = self.net_transform()
-        result = [0] * self.n2
-        for i in range(0, self.n2):
-            for j in range(0, self.n2):
-                result[j] = (result[j] + (net_transform[i] * self.transforms[i][j])) % 2
+        # the column parities, packed into an int
+        column_parity = 0
+        for row in net_transform:
+            column_parity ^= row
         moves = []
-        for i in range(0, self.n2):
-            if result[i] == 1:
-                moves.append(i)
+        for y in range(0, self.n):
+            row = net_transform[y]
+            result = row ^ column_parity
+            if bin(row).count('1') % 2 == 1:
+                result ^= self.full
+            while result != 0:
+                low = result & -result
+                moves.append(y * self.n + low.bit_length() - 1)
+                result ^= low
         return moves
         
+    # General solver for grids of any size. Bulb j is transformed by the 
+    # parity of the moves in its row (r), the parity of the moves in its 
+    # column (c) and the move at j itself (counted in both parities), so a 
+    # move vector v reaching the net transform t must have v_j = t_j + r + c. 
+    # Substituting this back into the definitions of the row and column 
+    # parities leaves a system in just the 2n parities:
+    #
+    #   (n + 1) r_y + sum of all c = parity of t over row y
+    #   (n + 1) c_x + sum of all r = parity of t over column x
+    #
+    # and each solution of this system gives exactly one move vector, so the 
+    # packed system is solved by Gaussian elimination in O(n^3 / word size) 
+    # rather than eliminating the n^2 x n^2 matrix. For even n the solution is
+    # unique. For odd n the (n + 1) terms vanish, the grid is solvable only if
+    # every row and column of t has the same parity, and the kernel has 
+    # dimension 2n - 2 (any even number of row flips and any even number of 
+    # column flips), in which case the lightest move vector is searched for.
+    # Sets self.solvable, self.kernel_dimension and self.minimal, and returns 
+    # the indexes of the moves, or None if the grid can't be fully lit.
+    def eliminated_transforms(self):
+        n = self.n
+        net_transform = self.net_transform()
+        net_columns = self.transpose(net_transform)
+        all_rows = (1 << n) - 1
+        all_columns = all_rows << n
+        equations = []
+        for y in range(0, n):
+            equation = all_columns | ((bin(net_transform[y]).count('1') % 2) << (2 * n))
+            if n % 2 == 0:
+                equation ^= 1 << y
+            equations.append(equation)
+        for x in range(0, n):
+            equation = all_rows | ((bin(net_columns[x]).count('1') % 2) << (2 * n))
+            if n % 2 == 0:
+                equation ^= 1 << (n + x)
+            equations.append(equation)
+        result = solve_gf2(equations, 2 * n)
+        if result is None:
+            self.solvable = False
+            self.kernel_dimension = 0
+            self.minimal = False
+            return None
+        solution, kernel = result
+        self.kernel_dimension = len(kernel)
+        row_flips = solution & all_rows
+        column_flips = solution >> n
+        if len(kernel) > 0:
+            row_flips, column_flips = self.minimal_weight_flips(net_transform, net_columns, row_flips, column_flips)
+        moves = []
+        for y in range(0, n):
+            result = net_transform[y] ^ column_flips
+            if (row_flips >> y) & 1:
+                result ^= self.full
+            while result != 0:
+                low = result & -result
+                moves.append(y * n + low.bit_length() - 1)
+                result ^= low
+        return moves
+
+    # Search the solutions of an odd-dimensioned grid, which are all the row
+    # and column parities with the same overall parities as the given 
+    # solution, for the one with the fewest moves. Given the column parities,
+    # the best row parities are found directly: each row takes whichever 
+    # parity leaves fewer moves in it, then the row that costs least to change
+    # is flipped if the overall parity is wrong. This is exhaustive over the 
+    # column parities for small grids, and otherwise alternates between 
+    # optimizing rows and columns from the given solution and from random 
+    # starting points, which finds a local minimum only (the problem is 
+    # equivalent to the Gale-Berlekamp switching game). Sets self.minimal and
+    # returns the row and column parities as packed ints.
+    def minimal_weight_flips(self, net_transform, net_columns, row_flips, column_flips):
+        n = self.n
+        row_parity = bin(row_flips).count('1') % 2
+        column_parity = bin(column_flips).count('1') % 2
+        if n <= self.exhaustive_limit:
+            best = None
+            for free in range(0, 1 << (n - 1)):
+                # the last column parity is fixed by the overall parity
+                columns = free | ((bin(free).count('1') % 2 ^ column_parity) << (n - 1))
+                rows, weight = self.best_flips(net_transform, columns, row_parity)
+                if best is None or weight < best[0]:
+                    best = (weight, rows, columns)
+            self.minimal = True
+            return best[1], best[2]
+        best = None
+        for restart in range(0, self.local_search_restarts + 1):
+            if restart == 0:
+                columns = column_flips
+            else:
+                columns = getrandbits(n)
+                if bin(columns).count('1') % 2 != column_parity:
+                    columns ^= 1
+            rows, weight = self.best_flips(net_transform, columns, row_parity)
+            while True:
+                next_columns, next_weight = self.best_flips(net_columns, rows, column_parity)
+                next_rows, next_weight = self.best_flips(net_transform, next_columns, row_parity)
+                if next_weight >= weight:
+                    break
+                rows, columns, weight = next_rows, next_columns, next_weight
+            if best is None or weight < best[0]:
+                best = (weight, rows, columns)
+        self.minimal = False
+        return best[1], best[2]
+
+    # Given packed lines of the net transform (rows, or columns if 
+    # transposed) and the flips of the crossing lines, choose the flip of each
+    # line to minimize the number of moves subject to the flips having the 
+    # given overall parity. Returns the flips as a packed int and the number
+    # of moves.
+    def best_flips(self, lines, crossing_flips, parity):
+        n = self.n
+        flips = 0
+        weight = 0
+        cheapest_change = None
+        for i in range(0, n):
+            ones = bin(lines[i] ^ crossing_flips).count('1')
+            if n - ones < ones:
+                flips |= 1 << i
+                weight += n - ones
+            else:
+                weight += ones
+            change = abs(n - 2 * ones)
+            if cheapest_change is None or change < cheapest_change[0]:
+                cheapest_change = (change, i)
+        if bin(flips).count('1') % 2 != parity:
+            flips ^= 1 << cheapest_change[1]
+            weight += cheapest_change[0]
+        return flips, weight
+
+    # packed rows transposed into packed columns
+    def transpose(self, rows):
+        columns = [0] * self.n
+        for y in range(0, self.n):
+            row = rows[y]
+            while row != 0:
+                low = row & -row
+                columns[low.bit_length() - 1] |= 1 << y
+                row ^= low
+        return columns
+        
     # The mask of the net transforms needed to change the starting state to all
-    # '1's (which is just the starting state, inverted)
+    # '1's (which is just the starting state, inverted), as packed rows
     def net_transform(self):
-        return list(map(lambda x: (x + 1) % 2, self.initial_state))
-        
-    # the matrix of transformations for all possible moves
-    def all_transforms(self):
-        all_t = []
-        for i in range(0, self.n2):
-            t = []
-            for j in range(0, self.n2):
-                if j // self.n == i // self.n:
-                    t.append(1)
-                elif j % self.n == i % self.n:
-                    t.append(1)
-                else:
-                    t.append(0)
-            all_t.append(t)
-        return all_t
+        return [row ^ self.full for row in self.rows]
         
     # Attempt to find a randomized solution where each required move is made
     # exactly once while respecting the rule that moves can only be made if the 
     # corresponding bulb is off. Returns False if the end state couldn't be 
     # reached
     def trial_solution(self):
+        n = self.n
         steps = []
-        done = False
-        state = copy.deepcopy(self.initial_state)
-        while not done:
-            if len(steps) == len(self.moves):
-                done = True
-                continue
-            # determine all candidate moves (required moves which haven't been 
-            # made yet where the bulb is currently off)
-            candidates = []
-            for move in self.moves:
-                if state[move] != 0:
-                    continue
-                if move in steps:
-                    continue
-                candidates.append((move))
-            # if no candidate moves are available, this attempt has failed
-            if len(candidates) == 0:
-                return False
-            # select a candidate move at random and apply the transform
-            candidate_index = randrange(0, len(candidates))
-            steps.append(candidates[candidate_index])
-            for i in range(0, self.n2):
-                state[i] ^= self.transforms[candidates[candidate_index]][i]
+        # the state is tracked as in BulbState, inlined here as this is the 
+        # innermost loop of the search: bulb (x, y) is lit if bit x of rows[y]
+        # differs from bit x of row_flips[y] ^ column_flips
+        rows = list(self.rows)
+        row_flips = [0] * n
+        column_flips = 0
+        full = self.full
+        # required moves which haven't been made yet
+        pending = list(self.moves)
+        while len(pending) > 0:
+            # select a candidate move (where the bulb is currently off) at 
+            # random. Typically a good fraction of the pending moves are 
+            # candidates, so try a few random picks before falling back to 
+            # listing all the candidates.
+            index = None
+            for attempt in range(0, 32):
+                i = int(random() * len(pending))
+                y, x = divmod(pending[i], n)
+                if ((rows[y] ^ row_flips[y] ^ column_flips) >> x) & 1 == 0:
+                    index = i
+                    break
+            if index is None:
+                candidates = []
+                # the unlit bulbs of each row, packed
+                unlit = [~(rows[y] ^ row_flips[y] ^ column_flips) for y in range(0, n)]
+                for i in range(0, len(pending)):
+                    y, x = divmod(pending[i], n)
+                    if (unlit[y] >> x) & 1:
+                        candidates.append(i)
+                # if no candidate moves are available, this attempt has failed
+                if len(candidates) == 0:
+                    return False
+                index = candidates[randrange(0, len(candidates))]
+            move = pending[index]
+            pending[index] = pending[-1]
+            pending.pop()
+            steps.append(move)
+            y, x = divmod(move, n)
+            row_flips[y] ^= full
+            column_flips ^= 1 << x
+            rows[y] ^= 1 << x
         return steps
         
+    # Deterministic alternative to trial_solution. Returns the required moves
+    # in a legal order, False if no legal order exists, or None if the search
+    # gave up after max_nodes moves (0 for no limit).
+    def ordered_solution(self, max_nodes = 0):
+        return MoveOrderSolver(self).solve(max_nodes)
+        
     # test that the provided list of moves doesn't include any invalid moves on
     # active bulbs and that it reaches a fully lit end state. Return the moves
     # as tuples of coordinates.
@@ -138,36 +385,410 @@ class BulbGrid:
             col = (move % self.n) + 1
             row = (move // self.n) + 1
             tuples.append((col,row))
-        state = copy.deepcopy(self.initial_state)
+        state = BulbState(self.n, self.rows)
         for i in range(0, len(tuples)):
-            move = (tuples[i][1] - 1) * self.n + (tuples[i][0] - 1)
-            if state[move] != 0:
+            if state.lit(tuples[i][0] - 1, tuples[i][1] - 1) != 0:
                 print("Illegal move made at step {} ({}, {}). Bulb is already lit".format(i + 1, tuples[i][0], tuples[i][1]))
                 return False
-            for j in range(0, self.n):
-                state[((tuples[i][1] - 1) * self.n) + j] ^= 1
-                state[((j) * self.n) + (tuples[i][0] - 1)] ^= 1
-            state[move] = 1
+            state.select(tuples[i][0] - 1, tuples[i][1] - 1)
         offBulbs = 0
-        for i in range(0, self.n2):
-            if state[i] != 1:
-                offBulbs += 1
+        for y in range(0, self.n):
+            offBulbs += bin(state.row(y) ^ self.full).count('1')
         if offBulbs > 0:
             print("Resulting state has {} bulb{} unlit.".format(offBulbs, '' if offBulbs == 1 else 's'))
             return False
         return tuples
 
+# Search for a legal order of the required moves of a bulb grid, or proof that
+# there is none.
+#
+# The moves are treated as the edges of a bipartite graph between rows and 
+# columns. If r and c are the parities of the moves already made in a 
+# move's row and column, its bulb is unlit when the initial state of the bulb 
+# plus r plus c is even. r is also the parity of the initial degree of the 
+# row plus its current degree (counting only moves still to be made), and 
+# likewise for c, so a move is legal exactly when the current degrees of its 
+# row and column sum to a fixed target parity. Whether a set of remaining 
+# moves can be completed therefore depends only on the set itself, and moves 
+# in different connected components never affect each other.
+#
+# Removing a legal edge (u, v) lowers the degrees of u and v by one, so the 
+# sum over a component of the edge targets plus d(d - 1)/2 for each vertex 
+# degree d changes by an even amount. As it is zero once every move is made, 
+# a component where it is odd can never be completed. Components of up to 
+# exact_limit moves are checked exactly by a memoised search over their move 
+# sets, and the whole grid is searched depth first, preferring moves at the 
+# row or column with fewest remaining moves, only making moves that leave no
+# component known to be unsolvable, and recording the remaining move sets 
+# (as bitsets) that have been found to fail.
+class MoveOrderSolver:
+    exact_limit = 16
+
+    def __init__(self, bulbGrid):
+        n = bulbGrid.n
+        self.n = n
+        self.moves = list(bulbGrid.moves)
+        # the row and column vertices of each move, columns numbered from n
+        self.ends = []
+        self.incident = [set() for i in range(0, 2 * n)]
+        for i in range(0, len(self.moves)):
+            y, x = divmod(self.moves[i], n)
+            self.ends.append((y, n + x))
+            self.incident[y].add(i)
+            self.incident[n + x].add(i)
+        # the parity that the current degrees of a move's row and column must
+        # sum to for it to be legal
+        self.targets = []
+        for i in range(0, len(self.moves)):
+            y, x = divmod(self.moves[i], n)
+            u, v = self.ends[i]
+            self.targets.append(((bulbGrid.rows[y] >> x) & 1) ^ (len(self.incident[u]) & 1) ^ (len(self.incident[v]) & 1))
+        # exact solvability of small sets of moves
+        self.solvable_sets = {}
+        
+    def legal(self, i):
+        u, v = self.ends[i]
+        return (len(self.incident[u]) + len(self.incident[v])) % 2 == self.targets[i]
+    
+    def remove(self, i):
+        u, v = self.ends[i]
+        self.incident[u].remove(i)
+        self.incident[v].remove(i)
+    
+    def restore(self, i):
+        u, v = self.ends[i]
+        self.incident[u].add(i)
+        self.incident[v].add(i)
+    
+    # The moves and vertices of the component containing vertex start, or 
+    # None if it has more than limit moves
+    def component(self, start, limit = None):
+        vertices = set([start])
+        edges = set()
+        stack = [start]
+        while len(stack) > 0:
+            vertex = stack.pop()
+            for i in self.incident[vertex]:
+                if i in edges:
+                    continue
+                edges.add(i)
+                if limit is not None and len(edges) > limit:
+                    return None
+                for end in self.ends[i]:
+                    if end not in vertices:
+                        vertices.add(end)
+                        stack.append(end)
+        return edges, vertices
+    
+    def invariant(self, edges, vertices):
+        total = 0
+        for i in edges:
+            total += self.targets[i]
+        for vertex in vertices:
+            degree = len(self.incident[vertex])
+            total += degree * (degree - 1) // 2
+        return total % 2
+    
+    # Exact test of whether a component can be completed: whether it has a 
+    # legal move after which the one or two components left can both be 
+    # completed
+    def component_solvable(self, edges, vertices):
+        if len(edges) == 0:
+            return True
+        if self.invariant(edges, vertices) != 0:
+            return False
+        key = frozenset(edges)
+        if key in self.solvable_sets:
+            return self.solvable_sets[key]
+        solvable = False
+        for i in edges:
+            if self.legal(i):
+                solvable = self.split_solvable(i, None)
+                if solvable:
+                    break
+        self.solvable_sets[key] = solvable
+        return solvable
+    
+    # Whether the pendant moves at vertex w (those whose other end has no 
+    # other moves) can all be made. Their legality depends only on the degree
+    # of w, and as that falls from d to 1 it is odd ceil(d/2) times and even 
+    # floor(d/2) times, so no more pendant moves than that can need each 
+    # parity.
+    def pendants_viable(self, w):
+        degree = len(self.incident[w])
+        need = [0, 0]
+        for i in self.incident[w]:
+            u, v = self.ends[i]
+            other = v if u == w else u
+            if len(self.incident[other]) == 1:
+                need[(self.targets[i] + 1) % 2] += 1
+        return need[1] <= (degree + 1) // 2 and need[0] <= degree // 2
+    
+    # Whether the components left at either end of move i once it is made can
+    # be completed, or are at least not known to be unsolvable if only those 
+    # of up to limit moves are tested
+    def split_solvable(self, i, limit):
+        self.remove(i)
+        u, v = self.ends[i]
+        # the pendant moves can only have changed at the ends of i, and at 
+        # the far end of the last move left at either of them
+        result = True
+        for end in [u, v]:
+            checked = [end]
+            if len(self.incident[end]) == 1:
+                last = self.ends[next(iter(self.incident[end]))]
+                checked.append(last[1] if last[0] == end else last[0])
+            for w in checked:
+                if not self.pendants_viable(w):
+                    result = False
+        if not result:
+            self.restore(i)
+            return False
+        component = self.component(u, limit)
+        if component is not None:
+            result = self.component_solvable(component[0], component[1])
+        if result and (component is None or v not in component[1]):
+            component = self.component(v, limit)
+            if component is not None:
+                result = self.component_solvable(component[0], component[1])
+        self.restore(i)
+        return result
+    
+    # whether making legal move i leaves no component known to be unsolvable
+    def viable(self, i):
+        return self.split_solvable(i, self.exact_limit)
+    
+    # A fixed pseudorandom order for breaking ties between moves and between 
+    # rows and columns. Breaking ties by index makes the search clear the grid
+    # in a regular pattern that dead-ends far more often.
+    def tie_break(self, index):
+        return (index * 2654435761) & 0xffffffff
+    
+    # the first legal, viable move not in tried, looking at rows and columns 
+    # in order of their number of remaining moves
+    def next_move(self, tried):
+        vertices = [vertex for vertex in range(0, 2 * self.n) if len(self.incident[vertex]) > 0]
+        vertices.sort(key=lambda vertex: (len(self.incident[vertex]), self.tie_break(vertex)))
+        for vertex in vertices:
+            for i in sorted(self.incident[vertex], key=self.tie_break):
+                if i not in tried and self.legal(i) and self.viable(i):
+                    return i
+        return None
+    
+    def solve(self, max_nodes = 0):
+        # every component must satisfy the invariant, and every row and column
+        # the pendant move counts, from the start
+        seen = set()
+        for vertex in range(0, 2 * self.n):
+            if vertex in seen or len(self.incident[vertex]) == 0:
+                continue
+            edges, vertices = self.component(vertex)
+            seen |= vertices
+            if self.invariant(edges, vertices) != 0:
+                return False
+            for w in vertices:
+                if not self.pendants_viable(w):
+                    return False
+        # remaining move sets that have been found to fail, as bitsets
+        failed = set()
+        remaining = (1 << len(self.moves)) - 1
+        path = []
+        # moves tried at each depth of the search
+        tried = [set()]
+        nodes = 0
+        while len(path) < len(self.moves):
+            i = None
+            if remaining not in failed:
+                i = self.next_move(tried[-1])
+            if i is None:
+                failed.add(remaining)
+                if len(path) == 0:
+                    return False
+                tried.pop()
+                last = path.pop()
+                self.restore(last)
+                remaining |= 1 << last
+                continue
+            nodes += 1
+            if max_nodes > 0 and nodes > max_nodes:
+                return None
+            tried[-1].add(i)
+            tried.append(set())
+            path.append(i)
+            self.remove(i)
+            remaining ^= 1 << i
+        return [self.moves[i] for i in path]
+
+# Random solvable bulb grid of size n, made by selecting bulbs at random on a
+# fully lit grid (ignoring the rule that only unlit bulbs can be selected)
+def randomBulbGridLines(n):
+    state = BulbState(n, [(1 << n) - 1] * n)
+    for i in range(0, (n * n) // 2):
+        state.select(randrange(0, n), randrange(0, n))
+    return [format(state.row(n - 1 - y), '0{}b'.format(n))[::-1] for y in range(0, n)]
+
+# Random bulb grid of size n with a legal order of its required moves, made 
+# by playing the game backwards from a fully lit grid: selecting lit bulbs at
+# random (each at most once) until about half the bulbs have been selected.
+# The grid's required moves are the selected bulbs whenever the solution is 
+# unique, which it is for even n.
+def randomOrderableBulbGridLines(n):
+    state = BulbState(n, [(1 << n) - 1] * n)
+    selected = set()
+    for i in range(0, (n * n) // 2):
+        for attempt in range(0, 50):
+            x = randrange(0, n)
+            y = randrange(0, n)
+            if (x, y) not in selected and state.lit(x, y) == 1:
+                selected.add((x, y))
+                state.select(x, y)
+                break
+    return [format(state.row(n - 1 - y), '0{}b'.format(n))[::-1] for y in range(0, n)]
+
+# Report the time taken by the deterministic ordering search on random grids
+# that have a legal order, and by a single randomized trial for comparison
+def orderingBenchmark(sizes):
+    print("Benchmarking ordering search on random orderable bulb grids...")
+    for n in sizes:
+        bulbGrid = BulbGrid(randomOrderableBulbGridLines(n))
+        start = perf_counter()
+        trial_result = bulbGrid.trial_solution()
+        trialTime = perf_counter() - start
+        start = perf_counter()
+        result = bulbGrid.ordered_solution()
+        elapsed = perf_counter() - start
+        if result is None or result == False:
+            outcome = "no order found"
+        elif bulbGrid.validate_solution(result) == False:
+            outcome = "invalid order"
+        else:
+            outcome = "ordered"
+        print("{} x {} grid, {} moves: {} in {:.3f}s (one randomized trial {} in {:.3f}s)".format(n, n, len(bulbGrid.moves), outcome, elapsed, 'failed' if trial_result == False else 'succeeded', trialTime))
+
+# Report the time taken to determine the required moves for random grids 
+# with the even-dimension parity solver and the general elimination solver
+def solverBenchmark(size):
+    even = size - (size % 2)
+    print("Benchmarking solvers on random bulb grids...")
+    for n, solvers in [(even, ['parity', 'elimination']), (even + 1, ['elimination'])]:
+        lines = randomBulbGridLines(n)
+        for solver in solvers:
+            start = perf_counter()
+            bulbGrid = BulbGrid(lines, solver)
+            elapsed = perf_counter() - start
+            print("{} x {} grid, {} solver: {} moves, kernel dimension {}{} in {:.3f}s".format(n, n, solver, len(bulbGrid.moves), bulbGrid.kernel_dimension, '' if bulbGrid.minimal else ' (not proven minimal)', elapsed))
+
+# seconds between progress reports while running trial solutions
+progressInterval = 5.0
+
+# Print a summary of the trial solutions run so far
+def reportTrials(attempts, maxattempts, start):
+    elapsed = perf_counter() - start
+    print("{:.0f}s: {} of {} trial solution(s) run ({:.1f}/s)".format(elapsed, attempts, maxattempts, attempts / elapsed if elapsed > 0 else 0))
+
+# Worker process for running trial solutions in parallel. Claims trial 
+# numbers from the shared counter and runs trial solutions until one succeeds,
+# the attempts run out or another worker has succeeded. A successful trial is
+# put on the result queue as (trial number, moves), and None is put on the 
+# queue when the worker finishes.
+def trialWorker(bulbGrid, maxattempts, attempts, stopEvent, resultQueue):
+    # forked processes inherit the parent's random state, so reseed
+    seed()
+    while not stopEvent.is_set():
+        with attempts.get_lock():
+            if attempts.value >= maxattempts:
+                break
+            attempts.value += 1
+            attempt = attempts.value
+        trial_result = bulbGrid.trial_solution()
+        if trial_result != False and bulbGrid.validate_solution(trial_result) != False:
+            stopEvent.set()
+            resultQueue.put((attempt, trial_result))
+            break
+    resultQueue.put(None)
+
+# Run up to maxattempts trial solutions, in the given number of worker 
+# processes if more than one, printing a periodic summary of progress. 
+# Returns the trial number and moves of the first successful trial, or None.
+def runTrials(bulbGrid, maxattempts, workers):
+    start = perf_counter()
+    lastReport = start
+    if workers == 1:
+        for i in range(0, maxattempts):
+            trial_result = bulbGrid.trial_solution()
+            if trial_result != False and bulbGrid.validate_solution(trial_result) != False:
+                return (i + 1, trial_result)
+            if perf_counter() - lastReport >= progressInterval:
+                reportTrials(i + 1, maxattempts, start)
+                lastReport = perf_counter()
+        reportTrials(maxattempts, maxattempts, start)
+        return None
+    attempts = multiprocessing.Value('l', 0)
+    stopEvent = multiprocessing.Event()
+    resultQueue = multiprocessing.Queue()
+    processes = []
+    for i in range(0, workers):
+        processes.append(multiprocessing.Process(target=trialWorker, args=(bulbGrid, maxattempts, attempts, stopEvent, resultQueue)))
+    for process in processes:
+        process.start()
+    result = None
+    finished = 0
+    while finished < workers:
+        try:
+            message = resultQueue.get(timeout=0.5)
+            if message is None:
+                finished += 1
+            elif result is None:
+                result = message
+        except queue.Empty:
+            if perf_counter() - lastReport >= progressInterval:
+                reportTrials(attempts.value, maxattempts, start)
+                lastReport = perf_counter()
+    for process in processes:
+        process.join()
+    if result is None:
+        reportTrials(attempts.value, maxattempts, start)
+    return result
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("inputfile", help="An input text file containing a bulb grid")
+    parser.add_argument("inputfile", nargs="?", help="An input text file containing a bulb grid")
     parser.add_argument("-m", "--maxattempts", default=1000, type=int, help="Maximum number of trial solutions to attempt")
     parser.add_argument("-t", "--trace", action="store_true", help="Print a step-by-step trace of a successful solution when found")
+    parser.add_argument("-s", "--solver", default="auto", choices=["auto", "parity", "elimination"], help="Method for determining the required moves (default: parity for even grids, elimination otherwise)")
+    parser.add_argument("-w", "--workers", default=1, type=int, help="Number of worker processes running trial solutions")
+    parser.add_argument("-d", "--deterministic", action="store_true", help="Search for an order of the required moves deterministically instead of by randomized trials")
+    parser.add_argument("-n", "--maxnodes", default=0, type=int, help="Maximum number of moves made by the deterministic search (0 for no limit)")
+    parser.add_argument("-b", "--benchmark", default=0, type=int, help="Benchmark the solvers on random grids of this size and exit")
+    parser.add_argument("-o", "--orderbenchmark", action="store_true", help="Benchmark the deterministic search on random grids of sizes 8 to 200 and exit")
     args = parser.parse_args()
+    if args.orderbenchmark:
+        orderingBenchmark([8, 16, 32, 64, 100, 200])
+        return
+    if args.benchmark > 0:
+        if args.benchmark < 2:
+            print("Specified benchmark size too small: {}".format(args.benchmark))
+            parser.print_usage()
+            exit()
+        solverBenchmark(args.benchmark)
+        return
     if args.maxattempts < 1:
         print("Specified attempts too small: {}".format(args.maxattempts))
         parser.print_usage()
         exit()
+    if args.workers < 1:
+        print("Specified workers too small: {}".format(args.workers))
+        parser.print_usage()
+        exit()
+    if args.maxnodes < 0:
+        print("Specified maximum nodes too small: {}".format(args.maxnodes))
+        parser.print_usage()
+        exit()
     inputfile = args.inputfile
+    if inputfile is None:
+        print("No input file specified")
+        parser.print_usage()
+        exit()
     if(not path.exists(inputfile)):
         print("Input file '{}' could not be found".format(inputfile))
         parser.print_usage()
@@ -175,7 +796,7 @@ def main():
     f = open(inputfile, 'r')
     lines = f.readlines()
     f.close()
-    bulbGrid = initializeBulbGrid(lines)
+    bulbGrid = initializeBulbGrid(lines, args.solver)
     if bulbGrid == None:
         print("Input file '{}' could not be parsed as a bulb grid".format(inputfile))
         parser.print_usage()
@@ -184,28 +805,41 @@ def main():
     print("\n######## Ponder This Challenge - April 2023 ########\n")
     bulbGrid.print_grid()
     print()
-    print("The minimum number of steps to transform the input bulbs to fully on is {}".format(len(bulbGrid.moves)))
-    print("Attempting a maximum of {} randomized trial solutions...".format(args.maxattempts))
-    for i in range(0, args.maxattempts):
-        trial_result = bulbGrid.trial_solution()
-        if trial_result != False:
-            print("Trial {} of {} succeeded".format(i + 1, args.maxattempts))
-            steps = bulbGrid.validate_solution(trial_result)
-            if steps != False:
-                print(steps)
-                if(args.trace):
-                    print("Starting solution trace...")
-                    bulbGrid.print_grid()
-                    for i in range(0, len(steps)):
-                        print(steps[i])
-                        bulbGrid.print_grid(trial_result[0:i+1])
-                    print(steps)
-            else:
-                print("Trial solution {} failed validation".format(trial_result))
-                continue
+    if not bulbGrid.solvable:
+        print("The input bulbs cannot be transformed to fully on")
+        exit()
+    if bulbGrid.kernel_dimension > 0:
+        print("The bulb selections reaching fully on form a space of dimension {}".format(bulbGrid.kernel_dimension))
+    if bulbGrid.minimal:
+        print("The minimum number of steps to transform the input bulbs to fully on is {}".format(len(bulbGrid.moves)))
+    else:
+        print("The fewest steps found to transform the input bulbs to fully on is {}, which may not be the minimum".format(len(bulbGrid.moves)))
+    if args.deterministic:
+        print("Searching for an order of the required moves...")
+        trial_result = bulbGrid.ordered_solution(args.maxnodes)
+        if trial_result == False:
+            print("No order of the required moves reaches fully on")
             exit()
-        else:
-            print("Trial {} of {} failed".format(i + 1, args.maxattempts))
-    print("A solution could not be found in {} attempts".format(args.maxattempts))
+        if trial_result is None:
+            print("The search gave up after {} moves".format(args.maxnodes))
+            exit()
+    else:
+        print("Attempting a maximum of {} randomized trial solutions with {} worker(s)...".format(args.maxattempts, args.workers))
+        result = runTrials(bulbGrid, args.maxattempts, args.workers)
+        if result is None:
+            print("A solution could not be found in {} attempts".format(args.maxattempts))
+            exit()
+        attempt, trial_result = result
+        print("Trial {} of {} succeeded".format(attempt, args.maxattempts))
+    steps = bulbGrid.validate_solution(trial_result)
+    print(steps)
+    if(args.trace):
+        print("Starting solution trace...")
+        bulbGrid.print_grid()
+        for i in range(0, len(steps)):
+            print(steps[i])
+            bulbGrid.print_grid(trial_result[0:i+1])
+        print(steps)
     
-main()
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,41 @@
 # https://research.ibm.com/haifa/ponderthis/challenges/November2023.html
 
 import argparse
-from os import path
+from os import path, replace
+from mmap import mmap, ACCESS_READ
 from sys import stderr, maxsize
 from copy import deepcopy
 from random import randrange
 import queue
+from time import perf_counter
+import multiprocessing
 
-IDA_STAR_NODE_SQUARE_INDEX = 0
-IDA_STAR_NODE_MOVE_INDEX = 1
+# Walking distance lookup table. Each row of a walking distance state is 
+# stored as the counts of tiles from the first three goal groups, packed as 
+# base-5 digits. Only 35 of the 125 possible codes can occur (the counts sum to
+# at most 4), so codes are ranked into 0-34 and a state indexes a flat table of
+# 4 blank rows x 35^3 row ranks. See Puzzle15.walkingDistanceIndex.
+WD_ROW_CODES = [a + 5 * b + 25 * c for c in range(0, 5) for b in range(0, 5) for a in range(0, 5) if a + b + c <= 4]
+WD_ROW_RANK = [WD_ROW_CODES.index(code) if code in WD_ROW_CODES else -1 for code in range(0, 125)]
+WD_TABLE_SIZE = 4 * 35 ** 3
+WD_UNREACHED = 0xff
+WD_TABLE_FILE = "walking_distances.bin"
+
+# Additive pattern databases. The goal cells 0-14 are split into three 
+# disjoint patterns of five cells, and each database holds the number of moves
+# of the pattern's tiles needed to bring them to their goal cells, ignoring 
+# all other tiles. Since no move is counted in more than one database the sum 
+# of the three is admissible. Patterns are defined by goal cell rather than 
+# tile value, so the same databases serve both goal states. A pattern state is
+# indexed by packing the positions of its tiles into 4 bits each.
+PDB_PATTERNS = [[0, 1, 4, 5, 8], [2, 3, 6, 7, 11], [9, 10, 12, 13, 14]]
+PDB_TABLE_SIZE = 1 << 20
+PDB_UNREACHED = 0xff
+PDB_TABLE_FILE = "pattern_database_{}.bin"
+# the neighboring cells of each cell of the board
+CELL_NEIGHBORS = [[c for c in (i - 4, i + 4) if 0 <= c < 16] + [c for c in (i - 1, i + 1) if c // 4 == i // 4] for i in range(0, 16)]
+# heuristics available to the IDA* search, see Puzzle15.estimate
+HEURISTICS = ['wd', 'pdb', 'max']
 
 # Reading from lines in an input file, this method should return lists of 
 # integers describing the 880 distinct 4x4 magic squares for the integers 0-15, 
@@ -156,6 +183,14 @@ class Puzzle15State:
                     result += "{}  ".format(tile_values[index4(x,y)])
             result += "\n"
         return result
+    # Returns a copy of this state, cheaper than deepcopy. The IDA* search 
+    # copies the start square once and then makes and undoes moves on it.
+    def copy(self):
+        result = Puzzle15State.__new__(Puzzle15State)
+        result.tiles = self.tiles
+        result.indexes = self.indexes
+        result.goalid = self.goalid
+        return result
     def getTiles(self):
         result = [0] * 16
         for i in range(0, 16):
@@ -206,14 +241,30 @@ class Puzzle15State:
         return True
 
 class Puzzle15:
-    def __init__(self):
+    def __init__(self, tablepath, heuristic='wd', pdbdir=''):
         # two possible goal states, 1-15 + 0 in order, and the same but with 14
         # and 15 swapped, to handle the two possible parities of all 15 puzzle
         # states.
         self.goal1 = Puzzle15State([1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,0])
         self.goal2 = Puzzle15State([1,2,3,4,5,6,7,8,9,10,11,12,13,15,14,0])
-        print("Building index of Walking Distances for the 15-puzzle...")
-        self.wdlookup = self.buildWalkingDistances()
+        self.wdweights = {}
+        # count of nodes visited by ida_star_search, for benchmarking
+        self.nodes_visited = 0
+        # optional shared multiprocessing.Value holding the length of the 
+        # shortest solution found by any process. ida_star won't look for 
+        # solutions of that length or longer.
+        self.shared_bound = None
+        self.pdbweights = {}
+        self.heuristic = heuristic
+        self.wdlookup = None
+        self.pdblookups = []
+        if heuristic != 'pdb':
+            self.wdlookup = self.loadTable(tablepath, WD_TABLE_SIZE, "index of Walking Distances", self.buildWalkingDistances)
+        if heuristic != 'wd':
+            for i in range(0, len(PDB_PATTERNS)):
+                pdbpath = path.join(pdbdir, PDB_TABLE_FILE.format(i + 1))
+                description = "pattern database {} of {}".format(i + 1, len(PDB_PATTERNS))
+                self.pdblookups.append(self.loadTable(pdbpath, PDB_TABLE_SIZE, description, lambda cells=PDB_PATTERNS[i]: self.buildPatternDatabase(cells)))
     
     def inversionCount(self, square, goalsquare):
         inversions = 0
@@ -256,73 +307,179 @@ class Puzzle15:
             return True
         return False
     
-    # keystring for the walking distances lookup
-    def walkingDistanceKey(self, positions):
-        group1 = sorted(positions[0])
-        group2 = sorted(positions[1])
-        group3 = sorted(positions[2])
-        group4 = sorted(positions[3])
-        return "[" + "[" + ",".join(map(str, group1))+"]," + "[" + ",".join(map(str, group2))+"]," + "[" + ",".join(map(str, group3))+"]," + "[" + ",".join(map(str, group4))+"]" + "]"
-        
+    # Pack a walking distance state into its index in the flat lookup table.
+    # counts[r][g] is the number of tiles in row r (or column r) whose goal 
+    # row (or column) is g, and blank is the row holding the blank. Each row 
+    # is reduced to the counts of the first three goal groups as base-5 digits
+    # and then ranked among the 35 possible digit combinations. The last row 
+    # and the last goal group are implied by the totals and are not stored.
+    def walkingDistanceIndex(self, counts, blank):
+        rank = WD_ROW_RANK
+        codes = [counts[r][0] + 5 * counts[r][1] + 25 * counts[r][2] for r in range(0, 3)]
+        return ((blank * 35 + rank[codes[0]]) * 35 + rank[codes[1]]) * 35 + rank[codes[2]]
+    
     # Construct the lookup of walking distances for all possible board states
     # using a BFS.
     # Note that the same lookup is used for the horizontal and vertical walking
     # distance of a puzzle state, with the tiles mapped to a walking distance 
-    # horizontally or vertically
+    # horizontally or vertically. 
+    # The lookup is a flat bytearray indexed by walkingDistanceIndex, with 
+    # WD_UNREACHED marking indexes that don't correspond to a valid state.
     def buildWalkingDistances(self):
-        goal = [[1,1,1,1],[2,2,2,2],[3,3,3,3],[4,4,4,0]]
-        goalKey = self.walkingDistanceKey(goal)
-        seen = {}
-        # queue elements are state, row index of 0, steps
-        queue = []
-        queueNext = []
-        queueNext.append([goal,3,0])
-        seen[goalKey] = 0
-        rounds = 0
+        table = bytearray([WD_UNREACHED]) * WD_TABLE_SIZE
+        goal = ((4,0,0,0),(0,4,0,0),(0,0,4,0),(0,0,0,3))
+        table[self.walkingDistanceIndex(goal, 3)] = 0
+        # queue elements are state and row index of 0
+        queueNext = [(goal, 3)]
+        steps = 0
         while len(queueNext) > 0:
-            rounds += 1
+            steps += 1
             queue = queueNext
             queueNext = []
-            while len(queue) > 0:
-                state = queue.pop()
-                # for up and down moves of 0, find all distinct elements that 
-                # can be swapped. 
-                # up elements
-                rows = state[0]
-                blank_row_index = state[1]
-                steps = state[2]
-                if blank_row_index > 0:
-                    unique_elements = set(rows[blank_row_index-1])
-                    for unique_element in unique_elements:
-                        nextRows = deepcopy(rows)
-                        nextRows[blank_row_index].remove(0)
-                        nextRows[blank_row_index-1].remove(unique_element)
-                        nextRows[blank_row_index].append(unique_element)
-                        nextRows[blank_row_index-1].append(0)
-                        nextKey = self.walkingDistanceKey(nextRows)
-                        if nextKey in seen:
+            for rows, blank_row_index in queue:
+                # for up and down moves of 0, move one tile of each goal group 
+                # present in the neighboring row into the blank's row
+                for next_row_index in (blank_row_index - 1, blank_row_index + 1):
+                    if next_row_index < 0 or next_row_index > 3:
+                        continue
+                    for group in range(0, 4):
+                        if rows[next_row_index][group] == 0:
                             continue
-                        nextSteps = steps + 1
-                        seen[nextKey] = nextSteps
-                        nextBlankIndex = blank_row_index-1
-                        queueNext.append([nextRows,nextBlankIndex, nextSteps])
-                # down elements
-                if blank_row_index < 3:
-                    unique_elements = set(rows[blank_row_index+1])
-                    for unique_element in unique_elements:
-                        nextRows = deepcopy(rows)
-                        nextRows[blank_row_index].remove(0)
-                        nextRows[blank_row_index+1].remove(unique_element)
-                        nextRows[blank_row_index].append(unique_element)
-                        nextRows[blank_row_index+1].append(0)
-                        nextKey = self.walkingDistanceKey(nextRows)
-                        if nextKey in seen:
+                        nextRows = [list(row) for row in rows]
+                        nextRows[blank_row_index][group] += 1
+                        nextRows[next_row_index][group] -= 1
+                        nextIndex = self.walkingDistanceIndex(nextRows, next_row_index)
+                        if table[nextIndex] != WD_UNREACHED:
                             continue
-                        nextSteps = steps + 1
-                        seen[nextKey] = nextSteps
-                        nextBlankIndex = blank_row_index+1
-                        queueNext.append([nextRows,nextBlankIndex, nextSteps])
-        return seen
+                        table[nextIndex] = steps
+                        queueNext.append((nextRows, next_row_index))
+        return table
+    
+    # Load a heuristic lookup table of size bytes from tablepath, calling build
+    # to construct it and saving it there first if the file is missing or the 
+    # wrong size. The file is the raw table and is memory-mapped read-only, so
+    # loading is effectively instant after the first run. If the table can't 
+    # be saved the in-memory copy is used instead.
+    def loadTable(self, tablepath, size, description, build):
+        if not path.exists(tablepath) or path.getsize(tablepath) != size:
+            print("Building {} for the 15-puzzle...".format(description))
+            table = build()
+            try:
+                f = open(tablepath + ".tmp", 'wb')
+                f.write(table)
+                f.close()
+                replace(tablepath + ".tmp", tablepath)
+                print("Saved {} to {}".format(description, tablepath))
+            except OSError as e:
+                print("Unable to save {} to {}: {}".format(description, tablepath, e), file=stderr)
+                return table
+        f = open(tablepath, 'rb')
+        table = mmap(f.fileno(), 0, access=ACCESS_READ)
+        f.close()
+        return table
+    
+    # Construct the pattern database for the tiles belonging in the given goal
+    # cells. The BFS runs over the positions of the pattern tiles plus the 
+    # blank, starting from the goal, where moving the blank into a cell not 
+    # held by a pattern tile costs nothing and swapping it with a pattern tile
+    # costs one move. States are expanded a cost at a time, first following
+    # the free blank moves, and each pattern position is given the cost at 
+    # which it is first reached with any blank position.
+    def buildPatternDatabase(self, cells):
+        table = bytearray([PDB_UNREACHED]) * PDB_TABLE_SIZE
+        seen = bytearray(PDB_TABLE_SIZE * 16)
+        index = 0
+        occupied = 0
+        for i in range(0, len(cells)):
+            index |= cells[i] << (4 * i)
+            occupied |= 1 << cells[i]
+        # states are the packed pattern positions, the blank position and a 
+        # bitmask of the cells held by pattern tiles
+        queueNext = [(index, 15, occupied)]
+        steps = 0
+        while len(queueNext) > 0:
+            queue = queueNext
+            queueNext = []
+            while len(queue) > 0:
+                index, blank, occupied = queue.pop()
+                key = (index << 4) | blank
+                if seen[key]:
+                    continue
+                seen[key] = 1
+                if table[index] == PDB_UNREACHED:
+                    table[index] = steps
+                for cell in CELL_NEIGHBORS[blank]:
+                    if occupied >> cell & 1:
+                        # find the pattern tile in cell and swap it with the 
+                        # blank
+                        shift = 0
+                        while (index >> shift) & 0xf != cell:
+                            shift += 4
+                        nextIndex = index + ((blank - cell) << shift)
+                        if not seen[(nextIndex << 4) | cell]:
+                            queueNext.append((nextIndex, cell, occupied ^ (1 << cell) ^ (1 << blank)))
+                    elif not seen[(index << 4) | cell]:
+                        queue.append((index, cell, occupied))
+            steps += 1
+        return table
+    
+    # For a goal state, list for each tile the pattern database it belongs to
+    # and the shift of its position in that database's packed index.
+    def patternWeights(self, goalsquare):
+        if goalsquare.tiles not in self.pdbweights:
+            tile_patterns = [0] * 16
+            tile_shifts = [0] * 16
+            for tile in range(1, 16):
+                index = goalsquare.indexOfTile(tile)
+                for i in range(0, len(PDB_PATTERNS)):
+                    if index in PDB_PATTERNS[i]:
+                        tile_patterns[tile] = i
+                        tile_shifts[tile] = 4 * PDB_PATTERNS[i].index(index)
+            self.pdbweights[goalsquare.tiles] = (tile_patterns, tile_shifts)
+        return self.pdbweights[goalsquare.tiles]
+    
+    # Build the packed pattern database indexes of the provided square. As 
+    # with the walking distance codes the IDA* search builds these once and 
+    # then updates them per move.
+    def patternIndexes(self, square, goalsquare):
+        tile_patterns, tile_shifts = self.patternWeights(goalsquare)
+        indexes = [0] * len(PDB_PATTERNS)
+        for tile in range(1, 16):
+            indexes[tile_patterns[tile]] |= square.indexOfTile(tile) << tile_shifts[tile]
+        return indexes
+    
+    # Estimate the number of moves from a square to the goal with the 
+    # selected heuristic, given the square's packed walking distance codes, 
+    # pattern database indexes and blank position. 'wd' uses the walking 
+    # distance, 'pdb' the sum of the pattern databases and 'max' the larger of
+    # the two, which is still admissible.
+    def estimate(self, row_codes, col_codes, pattern_indexes, blank):
+        result = 0
+        if self.heuristic != 'pdb':
+            result = self.codedWalkingDistance(row_codes, col_codes, blank)
+        if self.heuristic != 'wd':
+            pattern_estimate = 0
+            for i in range(0, len(pattern_indexes)):
+                pattern_estimate += self.pdblookups[i][pattern_indexes[i]]
+            if pattern_estimate > result:
+                result = pattern_estimate
+        return result
+    
+    # For a goal state, list the base-5 digit each tile adds to the packed 
+    # row code of the row (and column) it sits in. Tiles belonging to the last 
+    # goal row (or column) add nothing, since that group is implied.
+    def walkingDistanceWeights(self, goalsquare):
+        if goalsquare.tiles not in self.wdweights:
+            row_weights = [0] * 16
+            col_weights = [0] * 16
+            for tile in range(1, 16):
+                index = goalsquare.indexOfTile(tile)
+                if index // 4 < 3:
+                    row_weights[tile] = 5 ** (index // 4)
+                if index % 4 < 3:
+                    col_weights[tile] = 5 ** (index % 4)
+            self.wdweights[goalsquare.tiles] = (row_weights, col_weights)
+        return self.wdweights[goalsquare.tiles]
         
     # Determine the walking distance between a puzzle state and a goal state. 
     # Developed by Ken'ichiro Takahashi, see 
@@ -336,35 +493,36 @@ class Puzzle15:
     # can be done for columns in the vertical walking distance. 
     # The total walking distance is the sum of the horizontal + vertical 
     # distances.
-    # This method builds the horizontal and vertical walking distance keys for 
-    # the provided square, determines the values from a pre-built lookup of all
-    # possible walking distance states, and returns the horizontal + vertical
-    # sum.
+    # This method packs the horizontal and vertical walking distance states 
+    # of the provided square into table indexes (see walkingDistanceIndex), 
+    # determines the values from a pre-built lookup of all possible walking 
+    # distance states, and returns the horizontal + vertical sum.
     def walkingDistance(self, square, goalsquare):
-        wd_rows = []
-        wd_cols = []
-        for i in range(0,4):
-            wd_rows.append([0] * 4)
-            wd_cols.append([0] * 4)
-        for row in range(0,4):
-            for i in range(0,4):
-                tile = square.tileAtIndex(index4(i,row))
-                if tile == 0:
-                    wd_rows[row][i] = 0
-                else:
-                    wd_rows[row][i] = (goalsquare.indexOfTile(tile) // 4) + 1
-        for col in range(0,4):
-            for i in range(0,4):
-                tile = square.tileAtIndex(index4(col,i))
-                if tile == 0:
-                    wd_cols[col][i] = 0
-                else:
-                    wd_cols[col][i] = (goalsquare.indexOfTile(tile) % 4) + 1
-        wd_row_key = self.walkingDistanceKey(wd_rows)
-        wd_col_key = self.walkingDistanceKey(wd_cols)
-        wd_row_val = self.wdlookup[wd_row_key]
-        wd_col_val = self.wdlookup[wd_col_key]
-        return  wd_row_val+wd_col_val 
+        row_codes, col_codes = self.walkingDistanceCodes(square, goalsquare)
+        return self.codedWalkingDistance(row_codes, col_codes, square.indexOfTile(0))
+    
+    # Build the packed row and column codes of the walking distance states of
+    # the provided square (see walkingDistanceIndex). The IDA* search builds 
+    # these once for the start square and then updates them per move.
+    def walkingDistanceCodes(self, square, goalsquare):
+        row_weights, col_weights = self.walkingDistanceWeights(goalsquare)
+        row_codes = [0, 0, 0, 0]
+        col_codes = [0, 0, 0, 0]
+        tiles = square.tiles
+        for i in range(0, 16):
+            tile = tiles & 0xf
+            tiles >>= 4
+            row_codes[i >> 2] += row_weights[tile]
+            col_codes[i & 3] += col_weights[tile]
+        return row_codes, col_codes
+    
+    # Look up the walking distance of a square from its packed row and column
+    # codes and the index of its blank position.
+    def codedWalkingDistance(self, row_codes, col_codes, blank):
+        rank = WD_ROW_RANK
+        wd_row_index = (((blank >> 2) * 35 + rank[row_codes[0]]) * 35 + rank[row_codes[1]]) * 35 + rank[row_codes[2]]
+        wd_col_index = (((blank & 3) * 35 + rank[col_codes[0]]) * 35 + rank[col_codes[1]]) * 35 + rank[col_codes[2]]
+        return self.wdlookup[wd_row_index] + self.wdlookup[wd_col_index]
     
     # Find all neighbors of the blank position on the board and returns a list
     # of tile values that can be swapped.
@@ -386,30 +544,33 @@ class Puzzle15:
     # Perform an iterative deepinging A* (IDA*) search to find a path between 
     # the provided square and one of the two possible goal states. Return the 
     # path if found or False if the path is not reachable within the provided
-    # max_cost
+    # max_cost, or within the shared bound if one is set.
     def ida_star(self, start_square, max_cost):
         goal = self.goal1
         # if goal1 can't reach start_square by parity check, use goal2
         if not self.solvable(start_square, goal):
             goal = self.goal2
         # estimate initial depth to search to
-        bound = self.walkingDistance(start_square, goal)
-        if bound > max_cost:
-            return False
-        # Nodes in the list contain two parameters: a square state and the 
-        # value of the tile moved to reach the state from the previous state. 
-        # The start state has no move to reach it.
-        nodes = [[start_square, -1]]
+        row_codes, col_codes = self.walkingDistanceCodes(start_square, goal)
+        pattern_indexes = self.patternIndexes(start_square, goal)
+        bound = self.estimate(row_codes, col_codes, pattern_indexes, start_square.indexOfTile(0))
+        # The search makes and undoes moves on a single copy of the start 
+        # square. moves lists the value of the tile moved at each step of the
+        # current path, and path holds the packed tiles of every state on it.
+        square = start_square.copy()
+        moves = []
+        path = {square.tiles}
         while True:
-            cost_to_goal = self.ida_star_search(nodes, 0, bound, goal, max_cost)
-            # if the goal is reached, the node list will include the list of 
-            # moves and states that reach if from the start state. Skip the 
-            # first node in the list, as the start state did not require a move
-            # to reach it.
+            # tighten max_cost if another process has since found a shorter 
+            # solution, checked before each deepening of the search
+            if self.shared_bound is not None and self.shared_bound.value - 1 < max_cost:
+                max_cost = self.shared_bound.value - 1
+            if bound > max_cost:
+                return False
+            cost_to_goal = self.ida_star_search(square, moves, path, 0, bound, goal, max_cost, row_codes, col_codes, pattern_indexes)
+            # if the goal is reached, moves will hold the list of moves that 
+            # reach it from the start state.
             if cost_to_goal == 0:
-                moves = []
-                for i in range(1, len(nodes)):
-                    moves.append(nodes[i][IDA_STAR_NODE_MOVE_INDEX])
                 return moves
             # if the goal is unreachable within max_cost, return False    
             if cost_to_goal == -1:
@@ -420,18 +581,29 @@ class Puzzle15:
             bound = cost_to_goal
     
     # Perform the recursive DFS portion of the IDA* search. Return -1 if the 
-    # goal state is not estimated to be reachable from the current list of 
-    # states within max_cost, 0 if the goal is reached within the current 
-    # bounds of the search depth, and the estimated cost to reach the goal 
-    # otherwise. If the goal is reached, the list nodes should contain
-    # the list of states and moves that reach the goal.
-    def ida_star_search(self, nodes, cost, bound, goal, max_cost):   
+    # goal state is not estimated to be reachable from the current square 
+    # within max_cost, 0 if the goal is reached within the current bounds of 
+    # the search depth, and the estimated cost to reach the goal otherwise. 
+    # If the goal is reached, square will be the goal state and moves will
+    # hold the list of moves that reach it.
+    # Each move is made in place on square and undone after the recursive 
+    # call by swapping the same tile back. The path set holds the packed tiles 
+    # of the states on the current path so repeated states are found without 
+    # scanning back along it.
+    # row_codes and col_codes hold the packed walking distance codes of 
+    # square (see walkingDistanceCodes). A move only carries one tile between
+    # two rows or two columns, so each move updates two codes before recursing
+    # and restores them afterwards rather than rebuilding them from all 16 
+    # tiles. The pattern database indexes in pattern_indexes are kept up to 
+    # date the same way.
+    def ida_star_search(self, square, moves, path, cost, bound, goal, max_cost, row_codes, col_codes, pattern_indexes):   
+        self.nodes_visited += 1
         # If we've exceeded the maximum cost, assume the goal is unreachable
         # and search no deeper
         if cost > max_cost:
             return -1
-        node = nodes[-1]
-        estimated_cost = cost + self.walkingDistance(node[0], goal)
+        blank = square.indexOfTile(0)
+        estimated_cost = cost + self.estimate(row_codes, col_codes, pattern_indexes, blank)
         # Since the heuristic cannot overestimate cost (it may underestimate)
         # take the goal to be unreachable if the estimated cost exceeds
         # the maximum cost and search no deeper
@@ -442,30 +614,52 @@ class Puzzle15:
         if estimated_cost > bound:
             return estimated_cost
         # If we have reached the goal, the cost is 0
-        if node[IDA_STAR_NODE_SQUARE_INDEX].tiles == goal.tiles:
+        if square.tiles == goal.tiles:
             return 0
         # Test each possible next move from this state for the best estimated 
         # cost. If no moves reach a previously unseen state, take the goal to be
         # unreachable.
         min_cost_to_goal = -1
-        moves = self.availableMoves(node[IDA_STAR_NODE_SQUARE_INDEX])
-        for move in moves:
-            next_square = deepcopy(node[IDA_STAR_NODE_SQUARE_INDEX])
-            next_square.swap(0,move)
-            # Skip this move if we've previously reached this state in the 
-            # current node list
-            already_in_nodes = False
-            for i in range(0, len(nodes) - 1):
-                if nodes[len(nodes) - 1 - i][IDA_STAR_NODE_SQUARE_INDEX].tiles == next_square.tiles:
-                    already_in_nodes = True
-                    break
-            if already_in_nodes:
+        row_weights, col_weights = self.walkingDistanceWeights(goal)
+        tile_patterns, tile_shifts = self.patternWeights(goal)
+        # moving the same tile as the previous move would undo it
+        previous_move = moves[-1] if len(moves) > 0 else -1
+        for move in self.availableMoves(square):
+            if move == previous_move:
+                continue
+            move_index = square.indexOfTile(move)
+            square.swap(0,move)
+            # Skip this move if we've previously reached this state on the 
+            # current path
+            if square.tiles in path:
+                square.swap(0,move)
                 continue
-            nodes.append([next_square, move])
-            cost_to_goal = self.ida_star_search(nodes, cost + 1, bound, goal, max_cost)
-            # If the goal has been reached within this branch of the DFS the 
-            # current list of nodes will include the full path of states to it.
-            # Return 0 indicating that the goal is reached.
+            path.add(square.tiles)
+            moves.append(move)
+            # The moved tile takes the blank's old position. If it moves 
+            # between rows only the row codes change, otherwise it moves 
+            # between columns and only the column codes change.
+            if move_index >> 2 != blank >> 2:
+                codes = row_codes
+                src = move_index >> 2
+                dst = blank >> 2
+                weight = row_weights[move]
+            else:
+                codes = col_codes
+                src = move_index & 3
+                dst = blank & 3
+                weight = col_weights[move]
+            codes[src] -= weight
+            codes[dst] += weight
+            pattern_shift = (blank - move_index) << tile_shifts[move]
+            pattern_indexes[tile_patterns[move]] += pattern_shift
+            cost_to_goal = self.ida_star_search(square, moves, path, cost + 1, bound, goal, max_cost, row_codes, col_codes, pattern_indexes)
+            codes[src] += weight
+            codes[dst] -= weight
+            pattern_indexes[tile_patterns[move]] -= pattern_shift
+            # If the goal has been reached within this branch of the DFS, moves
+            # will include the full path to it. Return 0 indicating that the 
+            # goal is reached.
             if cost_to_goal == 0:
                 return 0
             # If the goal is estimated to be reachable within max_cost from this branch
@@ -474,8 +668,10 @@ class Puzzle15:
             if cost_to_goal != -1:
                 if min_cost_to_goal == -1 or min_cost_to_goal > cost_to_goal:
                     min_cost_to_goal = cost_to_goal
-            # Remove this move from the node list and try the next
-            nodes.pop()
+            # Undo this move and try the next
+            moves.pop()
+            path.remove(square.tiles)
+            square.swap(0,move)
         return min_cost_to_goal   
     # Ensure that we can reach the solutionsquare from one of the two starting states 
     # using the provided sequence of moves, that all the moves are legal,
@@ -503,10 +699,118 @@ class Puzzle15:
             print(statesquare)
         return True
 
+# Run the IDA* search to the given maximum depth from every magic square in 
+# turn, without stopping at solutions, and report the number of nodes visited 
+# per second.
+def searchBenchmark(puzzle, squares, maxdepth):
+    print("Benchmarking IDA* to a maximum depth of {} on all {} magic squares...".format(maxdepth, len(squares)))
+    puzzle.nodes_visited = 0
+    solutions = 0
+    start = perf_counter()
+    for i in range(0, len(squares)):
+        if puzzle.ida_star(Puzzle15State(squares[i]), maxdepth) != False:
+            solutions += 1
+        if (i + 1) % 1000 == 0 or i + 1 == len(squares):
+            elapsed = perf_counter() - start
+            print("{} squares searched, {} solution(s), {} nodes in {:.1f}s ({:.0f} nodes/s)".format(i + 1, solutions, puzzle.nodes_visited, elapsed, puzzle.nodes_visited / elapsed))
+
+# seconds between progress reports while searching all magic squares
+progressInterval = 5.0
+
+# Print a summary of the search over all magic squares so far
+def reportSearch(started, total, best, maxdepth, start):
+    elapsed = perf_counter() - start
+    shortest = "{} moves".format(best) if best <= maxdepth else "none"
+    print("{:.0f}s: {} of {} magic squares started, shortest solution so far: {}".format(elapsed, started, total, shortest))
+
+# Worker process for searching magic squares in parallel. Loads the lookup 
+# tables from their files, which were built by the main process and are 
+# memory-mapped, so the pages are shared between all workers rather than 
+# copied or rebuilt. Claims targets from the shared counter in the given 
+# order and searches each for a solution shorter than the shared best, 
+# putting each improvement on the result queue as (square index, moves). 
+# None is put on the queue when the worker finishes.
+def searchWorker(tablepath, heuristic, pdbdir, squares, order, maxdepth, nextTarget, best, resultQueue):
+    puzzle = Puzzle15(tablepath, heuristic, pdbdir)
+    puzzle.shared_bound = best
+    while True:
+        with nextTarget.get_lock():
+            if nextTarget.value >= len(order):
+                break
+            target = order[nextTarget.value]
+            nextTarget.value += 1
+        solution = puzzle.ida_star(Puzzle15State(squares[target]), maxdepth)
+        if solution != False:
+            with best.get_lock():
+                if len(solution) < best.value:
+                    best.value = len(solution)
+                    resultQueue.put((target, list(solution)))
+    resultQueue.put(None)
+
+# Search every magic square for the globally shortest solution of no more 
+# than maxdepth moves, in the given number of worker processes if more than 
+# one, printing a periodic summary of progress. Squares are searched in order
+# of their heuristic estimate, since those with low estimates are the most 
+# likely to have short solutions, and once a solution is found only shorter 
+# ones are searched for. Returns the square index and moves of the shortest 
+# solution, or None.
+def searchAllSquares(puzzle, tablepath, heuristic, pdbdir, squares, maxdepth, workers):
+    estimates = []
+    for i in range(0, len(squares)):
+        square = Puzzle15State(squares[i])
+        goal = puzzle.goal1 if puzzle.solvable(square, puzzle.goal1) else puzzle.goal2
+        row_codes, col_codes = puzzle.walkingDistanceCodes(square, goal)
+        estimates.append(puzzle.estimate(row_codes, col_codes, puzzle.patternIndexes(square, goal), square.indexOfTile(0)))
+    order = sorted(range(0, len(squares)), key=lambda i: estimates[i])
+    start = perf_counter()
+    lastReport = start
+    result = None
+    if workers == 1:
+        for i in range(0, len(order)):
+            max_cost = maxdepth if result is None else len(result[1]) - 1
+            solution = puzzle.ida_star(Puzzle15State(squares[order[i]]), max_cost)
+            if solution != False:
+                result = (order[i], list(solution))
+                print("Found a solution with {} moves".format(len(solution)))
+            if perf_counter() - lastReport >= progressInterval:
+                reportSearch(i + 1, len(order), maxdepth + 1 if result is None else len(result[1]), maxdepth, start)
+                lastReport = perf_counter()
+        return result
+    nextTarget = multiprocessing.Value('l', 0)
+    best = multiprocessing.Value('i', maxdepth + 1)
+    resultQueue = multiprocessing.Queue()
+    processes = []
+    for i in range(0, workers):
+        processes.append(multiprocessing.Process(target=searchWorker, args=(tablepath, heuristic, pdbdir, squares, order, maxdepth, nextTarget, best, resultQueue)))
+    for process in processes:
+        process.start()
+    finished = 0
+    while finished < workers:
+        try:
+            message = resultQueue.get(timeout=0.5)
+            if message is None:
+                finished += 1
+            elif result is None or len(message[1]) < len(result[1]):
+                result = message
+                print("Found a solution with {} moves".format(len(message[1])))
+        except queue.Empty:
+            if perf_counter() - lastReport >= progressInterval:
+                reportSearch(nextTarget.value, len(order), best.value, maxdepth, start)
+                lastReport = perf_counter()
+    for process in processes:
+        process.join()
+    return result
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("inputfile", help="a provided file listing all 880 distinct 4x4 magic squares")
     parser.add_argument("-m", "--maxdepth", default=50, type=int, help="maximum move depth to explore for solutions")
+    parser.add_argument("-t", "--wdtable", default=path.join(path.dirname(path.abspath(__file__)), WD_TABLE_FILE), help="file to load the walking distance lookup from, or save it to if missing (default: {} beside this script)".format(WD_TABLE_FILE))
+    parser.add_argument("-e", "--heuristic", default="max", choices=HEURISTICS, help="heuristic for the IDA* search: walking distance (wd), additive pattern databases (pdb) or the larger of the two (max) (default: max)")
+    parser.add_argument("-p", "--pdbdir", default=path.dirname(path.abspath(__file__)), help="directory to load the pattern databases from, or save them to if missing (default: beside this script)")
+    parser.add_argument("-s", "--shortest", action="store_true", help="search every magic square for the shortest solution instead of stopping at the first found")
+    parser.add_argument("-w", "--workers", default=1, type=int, help="number of worker processes searching magic squares, implies --shortest if more than 1")
+    parser.add_argument("-b", "--benchmark", action="store_true", help="search every magic square to the maximum move depth, report nodes visited per second and exit")
     args = parser.parse_args()
     # Handle maxdepth argument
     maximum_solution_length = args.maxdepth
@@ -517,6 +821,10 @@ def main():
     if maximum_solution_length > 80:
         print("Specified maximum move depth {} is too large. There are no optimal solutions to the 15 Puzzle that exceed 80 moves. Maximum move depth set to 80.".format(maximum_solution_length))
         maximum_solution_length = 80
+    if args.workers < 1:
+        print("Specified workers {} is too small.".format(args.workers), file=stderr)
+        parser.print_usage()
+        exit()
     # Handle input file
     inputfile = args.inputfile
     if(not path.exists(inputfile)):
@@ -533,7 +841,25 @@ def main():
         exit()
     print("Loaded {} magic squares, including those produced by rotation and reflection, from input file {}".format(len(squares), inputfile))
     
-    puzzle = Puzzle15()
+    puzzle = Puzzle15(args.wdtable, args.heuristic, args.pdbdir)
+    if args.benchmark:
+        searchBenchmark(puzzle, squares, maximum_solution_length)
+        return
+    if args.shortest or args.workers > 1:
+        print("Searching all magic squares for the shortest solution from a sorted 15-puzzle state with no more than {} steps, with {} worker(s)...".format(maximum_solution_length, args.workers))
+        result = searchAllSquares(puzzle, args.wdtable, args.heuristic, args.pdbdir, squares, maximum_solution_length, args.workers)
+        if result is None:
+            print("No solutions found.")
+            return
+        square = Puzzle15State(squares[result[0]])
+        solution = result[1]
+        # reverse the path from the square to the sorted state
+        solution.reverse()
+        print("Verifying solution {}...".format(solution))
+        if not puzzle.verify(solution, square, True):
+            print("Solution did not pass verification")
+            printSquare(square)
+        return
     print("Attempting to find solutions to reach a magic square from a sorted 15-puzzle state with no more than {} steps...".format(maximum_solution_length))
     remaining_squares = deepcopy(squares)
     attempts = 0